@@ -3,7 +3,7 @@ import os
 import sys
 import types
 
-from . import tools, path
+from . import tools, path, profiler, trace
 from .filesystem import Filesystem
 from .command import Command
 from .target import Target
@@ -66,12 +66,17 @@ class Build:
         self.directory = directory
         self.root_directory = project.directory
         self.dependencies_directory = path.join(directory, dependencies_directory)
-        self.targets = []
+        self.__targets = {}
+        self.__targets_list = None
         self.__dependencies = []
         self.__dependencies_build = None
         self.fs = Filesystem(self)
         self.project = project
         self.__seen_commands = None
+        # Set when the generated files are known to be up to date (see
+        # build_cache.py), or once generated.
+        self.up_to_date = False
+        self.generated = False
 
         if not generator_name:
             generator_name = self.env.get('build_generator')
@@ -112,11 +117,32 @@ class Build:
         self.__target_commands.setdefault(command.target, []).append(command)
         return command
 
+    @property
+    def targets(self):
+        """Build targets, in insertion order."""
+        if self.__targets_list is None:
+            self.__targets_list = list(self.__targets.values())
+        return self.__targets_list
+
+    def target(self, target_path):
+        """Returns the target with the given path (relative to the build
+        directory, or absolute), or None.
+        """
+        return self.__targets.get(path.absolute(self.directory, target_path))
+
     def add_target(self, target):
         assert isinstance(target, Target)
-        if target not in self.targets:
+        existing = self.__targets.get(target.path)
+        if existing is None:
             tools.debug("add target %s" % target)
-            self.targets.append(target)
+            self.__targets[target.path] = target
+            self.__targets_list = None
+        elif existing is not target:
+            raise Exception(
+                "Path %s is generated by two different targets: %s and %s" % (
+                    target.path, existing, target
+                )
+            )
         return target
 
     def add_targets(self, *targets):
@@ -129,26 +155,46 @@ class Build:
     def add_dependency(self, cls, *args, **kw):
         assert issubclass(cls, Dependency)
         tools.debug("add dependency", cls, args, kw)
-        dependency = cls(self.dependencies_build, *args, **kw)
+        with profiler.phase('dependency') as phase:
+            dependency = cls(self.dependencies_build, *args, **kw)
+            phase.name = 'dependency %s' % dependency.name
         self.__dependencies.append(dependency)
         self.dependencies_build.add_targets(dependency.targets)
         return dependency
 
+    def visit(self, visitor):
+        """Visit once all nodes reachable from the build targets (see
+        `node.visit()`).
+        """
+        from .node import visit
+        return visit(self.targets, visitor)
+
+    def nodes(self):
+        """Yield once all nodes reachable from the build targets,
+        dependencies first.
+        """
+        from .node import walk
+        return walk(self.targets)
+
+    def graph(self):
+        """Returns a compact snapshot of the build graph (see graph.py)."""
+        from .graph import Graph
+        return Graph.from_nodes(self.nodes())
+
     def dump(self):
         print("Build: ", self)
-        class Visitor:
-            def __init__(self):
-                self.inc = 2
-            def __call__(self, node):
-                print(self.inc * ' ', repr(node))
-                self.inc += 2
-                for dep in node.dependencies:
-                    self(dep)
-                self.inc -= 2
-        v = Visitor()
-        for t in self.targets:
-            v(t)
-
+        seen = set()
+        stack = [(t, 2) for t in reversed(self.targets)]
+        while stack:
+            node, indent = stack.pop()
+            if node in seen:
+                print(indent * ' ', repr(node), '(see above)')
+                continue
+            seen.add(node)
+            print(indent * ' ', repr(node))
+            stack.extend((dep, indent + 2) for dep in reversed(node.dependencies))
+
+    @profiler.timed('generate')
     def generate(self):
         tools.verbose("Entering build directory '%s'" % self.directory)
 
@@ -165,14 +211,32 @@ class Build:
                 tools.debug("Creating directory", dirname)
                 os.makedirs(dirname)
         with self.generator:
-            for target in self.targets:
-                target.visit(self.generator)
+            self.visit(self.generator)
+        self.generated = True
 
         tools.verbose("Leaving build directory '%s'" % self.directory)
 
+    def generated_files(self):
+        """Files written by `generate()`, or an empty list when unknown."""
+        files = self.generator.outputs
+        if files and self.__dependencies_build is not None:
+            dependencies_files = self.__dependencies_build.generated_files()
+            if not dependencies_files:
+                return []
+            files = files + dependencies_files
+        return files
+
     def cleanup(self):
         pass
 
+    def execute(self, jobs = None):
+        """Build all targets without any generated file (see executor.py).
+
+        Returns 0 on success.
+        """
+        from .executor import Executor
+        return Executor(self, jobs = jobs).run()
+
     def find_binary(self, name, env_name = None):
         """Find a binary with tools.find_binary using build env.
         If env_name is not given, it defaults to the uppercased binary name.
@@ -187,6 +251,7 @@ class Build:
     def sh_program(self):
         return self.find_binary('sh')
 
+    @profiler.timed('command scripts')
     def generate_commands(self,
                           commands,
                           force_working_directory = None,
@@ -245,25 +310,84 @@ class Build:
             script += '\n)'
         script += '\n'
 
-        if os.path.exists(cmd_path):
-            with open(cmd_path, 'rb') as f:
-                if f.read().decode('utf8') == script:
-                    return
-            is_new = False
+        is_new = not os.path.exists(cmd_path)
+        if tools.write_if_changed(cmd_path, script, mode = 0o744):
             tools.status(
-                "Update command",
+                is_new and "Create command" or "Update command",
                 path.relative(cmd_path, start = self.project.directory)
             )
-        else:
-            is_new = True
+
+    @property
+    def command_manifest(self):
+        """Path of the command manifest (see generators/run_command.py)."""
+        return path.join(self.directory, '.build-commands')
+
+    def command_manifest_entry(self, commands, force_working_directory = None):
+        """Returns the command manifest entry of commands building the same
+        target.
+        """
+        entry = []
+        for cmd in commands:
+            env = {}
+            for k in cmd.os_env:
+                v = os.environ.get(k)
+                if v is not None:
+                    env[k] = v
+            env.update(cmd.env)
+
+            if force_working_directory is None:
+                working_directory = cmd.working_directory
+            else:
+                working_directory = force_working_directory
+            if not path.exists(working_directory):
+                raise Exception("Command working directory %s does not exists" % working_directory)
+
+            entry.append({
+                'action': cmd.action,
+                'target': cmd.target.relative_path(working_directory),
+                'command': cmd.relative_command(working_directory),
+                'cwd': working_directory,
+                'env': env,
+            })
+        return entry
+
+    @profiler.timed('command manifest')
+    def generate_command_manifest(self, entries, os_env = ('PATH',)):
+        """Write the command manifest from a dict of entries (created with
+        `command_manifest_entry`) indexed by a target key.
+
+        The manifest is rewritten only when its content changed, and the
+        command log is cleaned from obsolete keys.
+        """
+        from .generators import run_command
+        header = {
+            'os_env': dict(
+                (k, os.environ[k]) for k in sorted(os_env) if k in os.environ
+            ),
+            'trace': trace.enabled(self),
+        }
+        content = run_command.manifest_content(header, entries)
+        manifest = self.command_manifest
+        is_new = not os.path.exists(manifest)
+        if tools.write_if_changed(manifest, content):
             tools.status(
-                "Create command",
-                path.relative(cmd_path, start = self.project.directory)
+                is_new and "Create command manifest" or "Update command manifest",
+                path.relative(manifest, start = self.project.directory)
             )
-        with open(cmd_path, 'wb') as f:
-            f.write(script.encode('utf8'))
-        if is_new:
-            os.chmod(cmd_path, 0o744)
+
+        log = run_command.log_path(manifest)
+        if os.path.exists(log):
+            variables = set(run_command.log_variable(k) for k in entries)
+            with open(log) as f:
+                old_lines = f.readlines()
+            lines = {}
+            for line in old_lines:
+                variable = line.split(' ', 1)[0]
+                if variable in variables:
+                    lines.pop(variable, None)
+                    lines[variable] = line
+            if list(lines.values()) != old_lines:
+                tools.write_if_changed(log, ''.join(lines.values()))
 
 
 
@@ -289,3 +413,125 @@ class _(TestCase):
                 bld.generate()
             self.assertTrue(os.path.isfile(path.join(p.directory, 'pif', 'Makefile')))
 
+    def test_generate_ninja(self):
+        cfg = textwrap.dedent(
+            """
+            def main(bld):
+                pass
+            """
+        )
+        with TemporaryProject(cfg, build_dirs = ['pif']) as p:
+            with p.configure('pif', generator_name = 'Ninja') as bld:
+                bld.generate()
+            with open(path.join(p.directory, 'pif', 'build.ninja')) as f:
+                content = f.read()
+            self.assertIn('\ndefault all\n', content)
+            self.assertTrue(os.path.isfile(path.join(p.directory, 'pif', 'Makefile')))
+
+    def test_visit_once(self):
+        from .source import Source
+        with TemporaryProject() as p:
+            build = Build(p, path.join(p.directory, 'build'), 'Makefile')
+            previous = [Source(build, 'a.c'), Source(build, 'b.c')]
+            for i in range(20):
+                previous = [
+                    Target(build, 'l%s/t%s' % (i, j), dependencies = list(previous))
+                    for j in range(2)
+                ]
+            visited = []
+            build.visit(visited.append)
+            self.assertEqual(len(visited), 42)
+            self.assertEqual(len(set(visited)), 42)
+
+    def test_graph(self):
+        from .source import Source
+        with TemporaryProject() as p:
+            build = Build(p, path.join(p.directory, 'build'), 'Makefile')
+            src = Source(build, 'a.c')
+            obj = Target(build, 'a.o', dependencies = [src])
+            exe = Target(build, 'a.exe', dependencies = [obj])
+            graph = build.graph()
+            self.assertEqual(len(graph), 3)
+            node = graph.node(exe.path)
+            self.assertEqual([n.path for n in node.dependencies], [obj.path])
+            self.assertEqual([n.path for n in graph.node(src.path).dependents], [obj.path])
+
+    def test_targets(self):
+        with TemporaryProject() as p:
+            build = Build(p, path.join(p.directory, 'build'), 'Makefile')
+            targets = [Target(build, 'dir/t%s' % i) for i in range(10)]
+            self.assertEqual(build.targets, targets)
+            self.assertIs(build.target('dir/t3'), targets[3])
+            self.assertIs(build.target(path.join(build.directory, 'dir/t4')), targets[4])
+            self.assertIsNone(build.target('dir/t10'))
+            self.assertIs(build.targets, build.targets)
+            build.add_target(targets[0])
+            self.assertEqual(len(build.targets), 10)
+            targets.append(Target(build, 'dir/t10'))
+            self.assertEqual(build.targets, targets)
+            with self.assertRaises(Exception):
+                Target(build, 'dir/t5')
+
+    def test_command_manifest(self):
+        from .generators import run_command
+        cfg = textwrap.dedent(
+            """
+            def main(bld):
+                pass
+            """
+        )
+        with TemporaryProject(cfg, build_dirs = ['pif']) as p:
+            with p.configure('pif', generator_name = 'Makefile') as bld:
+                entries = dict(
+                    ('dir%s/target%s.o' % (i % 7, i), [{'action': str(i)}])
+                    for i in range(100)
+                )
+                bld.generate_command_manifest(entries)
+                for key, entry in entries.items():
+                    header, hash, found = run_command.lookup(bld.command_manifest, key)
+                    self.assertEqual(found, entry)
+                    self.assertEqual(hash, run_command.entry_hash(entry))
+                self.assertIsNone(run_command.lookup(bld.command_manifest, 'pif'))
+                self.assertIsNone(run_command.lookup(bld.command_manifest, 'zzz'))
+
+    def test_write_fragments(self):
+        with TemporaryProject() as p:
+            build = Build(p, path.join(p.directory, 'build'), 'Makefile')
+            d = path.join(build.directory, 'rules')
+            def write(fragments):
+                with build.generator.fragments(d) as f:
+                    for name, content in fragments:
+                        with f.open(name) as out:
+                            out.write(content)
+                return f.files
+            files = write([('a.mk', 'a'), ('b.mk', 'b')])
+            self.assertEqual([path.basename(f) for f in files], ['a.mk', 'b.mk'])
+            for f in files:
+                os.utime(f, ns = (0, 0))
+            write([('a.mk', 'a'), ('c.mk', 'c')])
+            self.assertEqual(os.stat(path.join(d, 'a.mk')).st_mtime_ns, 0)
+            self.assertFalse(os.path.exists(path.join(d, 'b.mk')))
+            with open(path.join(d, 'c.mk')) as f:
+                self.assertEqual(f.read(), 'c')
+            self.assertEqual(sorted(os.listdir(d)), ['a.mk', 'c.mk', 'index'])
+
+    def test_reduce_dependencies(self):
+        from .source import Source
+        with TemporaryProject(build_dirs = ['build']) as p:
+            def rules(reduce):
+                build = Build(p, path.join(p.directory, 'build'), 'Makefile', save_generator = False)
+                build.env['REDUCE_DEPENDENCIES'] = reduce
+                a = build.fs.copy(Source(build, 'a.txt'), dest_dir = 'out')
+                b = Command('Cat', ['cat', a], Target(build, 'out/b'), inputs = [a]).target
+                Command('Cat', ['cat', a, b], Target(build, 'out/c'), inputs = [a, b])
+                build.generate()
+                rules_dir = path.join(build.directory, '.rules')
+                res = ''
+                for f in sorted(os.listdir(rules_dir)):
+                    with open(path.join(rules_dir, f)) as f:
+                        res += f.read()
+                rule = res.split('out/c:')[1].split('\n\t')[0]
+                words = rule.replace('\\', ' ').split()
+                return [w for w in words if not w.startswith('$(') and 'FORCE' not in w]
+            self.assertEqual(sorted(rules(False)), ['out/a.txt', 'out/b'])
+            self.assertEqual(rules(True), ['out/b'])
@@ -0,0 +1,297 @@
+# -*- encoding: utf-8 -*-
+
+"""Configure cache.
+
+Calling the `main` function of a project is slow on large projects: libraries
+are searched, compilers are probed and the whole build graph is created. The
+configured build is pickled in its directory along with everything it was
+configured from:
+
+    - the project file and the python modules it imported (configure.py
+      modules included);
+    - the project and build variables;
+    - the environment variables used by commands (see `Command.os_env`),
+      whose values are written in the command manifest;
+    - the binaries and directories looked up, found or not (see
+      `tools.record_input()`): the directories of PATH searched for a
+      binary, the candidate library and include directories.
+
+When none of them changed, the build is loaded back instead of calling
+`main` again. Generation is skipped as well when the files generated from it
+are untouched.
+"""
+
+import io
+import os
+import pickle
+import sys
+
+from . import path
+from . import tools
+
+# Bump when the cache format changes
+VERSION = 2
+
+def cache_path(build_directory):
+    """Path of the configure cache of a build directory."""
+    return path.join(build_directory, '.configure-cache')
+
+def _stamp(p):
+    try:
+        st = os.stat(p)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _stamps(paths):
+    return dict((p, _stamp(p)) for p in paths)
+
+def _module_files(project):
+    """Returns the files of loaded modules that may have been used to
+    configure the project.
+    """
+    directories = (
+        project.config_directory + '/',
+        path.dirname(path.absolute(__file__)) + '/',
+    )
+    files = [project.config_file]
+    for module in list(sys.modules.values()):
+        f = getattr(module, '__file__', None)
+        if f and path.absolute(f).startswith(directories):
+            files.append(path.absolute(f))
+    return files
+
+def _os_env(build):
+    """Returns the environment variables used by the commands of a build,
+    with their current value (None when not set).
+    """
+    from .command import Command
+    keys = set()
+    def visit(node):
+        if isinstance(node, Command):
+            keys.update(node.os_env)
+    build.visit(visit)
+    return dict((k, os.environ.get(k)) for k in sorted(keys))
+
+def _state(project, env, generator_name):
+    return {
+        'version': VERSION,
+        'python': sys.version,
+        'path': list(tools.PATH),
+        'project_env': dict(project.env.items()),
+        'build_env': dict(env.items()),
+        'generator': generator_name,
+    }
+
+class _Pickler(pickle.Pickler):
+    """Pickle a build, except for its project (and the project env) that
+    are created from the project file at each run.
+    """
+
+    def __init__(self, file, project):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.project = project
+
+    def persistent_id(self, obj):
+        if obj is self.project:
+            return 'project'
+        if obj is self.project.env:
+            return 'project_env'
+        return None
+
+class _Unpickler(pickle.Unpickler):
+
+    def __init__(self, file, project):
+        super().__init__(file)
+        self.project = project
+
+    def persistent_load(self, id):
+        if id == 'project':
+            return self.project
+        if id == 'project_env':
+            return self.project.env
+        raise pickle.UnpicklingError("Invalid persistent id %s" % id)
+
+def dump(build):
+    """Returns the cache entry of a build freshly configured, or None when
+    the build cannot be pickled.
+    """
+    f = io.BytesIO()
+    try:
+        _Pickler(f, build.project).dump(build)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        tools.verbose("Cannot cache the build in", build.directory, ':', e)
+        return None
+    return {
+        'state': _state(
+            build.project,
+            build.env,
+            build.generator.__class__.__name__
+        ),
+        'inputs': _stamps(set(_module_files(build.project)) | tools.INPUTS),
+        'os_env': _os_env(build),
+        'build': f.getvalue(),
+    }
+
+def save(build, entry):
+    """Save the cache entry of a build once generated."""
+    entry = dict(entry, outputs = _stamps(build.generated_files()))
+    filename = cache_path(build.directory)
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)
+    tools.debug("Saved configure cache", filename)
+
+def load(project, build_directory, env, generator_name = None):
+    """Returns the cached build and its cache entry, or (None, None) when
+    the build has to be configured again.
+
+    positional arguments:
+
+        project: The project instance
+        build_directory: The build directory
+        env: The build env, as it would be given to the `main` function
+
+    optional arguments:
+
+        generator_name: The generator requested
+    """
+    filename = cache_path(build_directory)
+    try:
+        with open(filename, 'rb') as f:
+            entry = pickle.load(f)
+    except FileNotFoundError:
+        return None, None
+    except Exception as e:
+        tools.debug("Ignore invalid configure cache", filename, ':', e)
+        return None, None
+    if not isinstance(entry, dict) or entry.get('state', {}).get('version') != VERSION:
+        return None, None
+    state = _state(
+        project,
+        env,
+        generator_name or env.get('build_generator')
+    )
+    if entry['state'] != state:
+        tools.debug("Configure cache of", build_directory, "is outdated (variables changed)")
+        return None, None
+    for p, stamp in entry['inputs'].items():
+        if _stamp(p) != stamp:
+            tools.debug("Configure cache of", build_directory, "is outdated (%s changed)" % p)
+            return None, None
+    for k, v in entry['os_env'].items():
+        if os.environ.get(k) != v:
+            tools.debug("Configure cache of", build_directory, "is outdated (%s changed)" % k)
+            return None, None
+    try:
+        build = _Unpickler(io.BytesIO(entry['build']), project).load()
+    except Exception as e:
+        tools.debug("Cannot load configure cache", filename, ':', e)
+        return None, None
+    outputs = entry['outputs']
+    build.up_to_date = bool(outputs) and _stamps(outputs) == outputs
+    tools.verbose("Loaded build", build_directory, "from the configure cache")
+    return build, entry
+
+
+from unittest import TestCase
+import textwrap
+
+class _(TestCase):
+
+    config = textwrap.dedent(
+        """
+        import os
+        def main(build):
+            with open(os.path.join(build.directory, 'calls'), 'a') as f:
+                f.write('.')
+        """
+    )
+
+    def configure(self, project, **kw):
+        with project.configure('build', generator_name = 'Makefile', **kw) as build:
+            if not build.up_to_date:
+                build.generate()
+        with open(path.join(project.directory, 'build', 'calls')) as f:
+            return len(f.read())
+
+    def test_cache(self):
+        from .project import TemporaryProject, Project
+        with TemporaryProject(config = self.config, build_dirs = ['build']) as p:
+            self.assertEqual(self.configure(p), 1)
+            self.assertEqual(self.configure(p), 1)
+            self.assertEqual(self.configure(p, use_cache = False), 2)
+            self.assertEqual(self.configure(p), 2)
+
+            # Variables are part of the cache key
+            self.assertEqual(self.configure(p, new_build_vars = {'A': 1}), 3)
+            self.assertEqual(self.configure(p, new_build_vars = {'A': 1}), 3)
+
+            # Generated files are checked
+            os.unlink(path.join(p.directory, 'build', 'Makefile'))
+            with p.configure('build', generator_name = 'Makefile') as build:
+                self.assertFalse(build.up_to_date)
+                build.generate()
+            self.assertEqual(self.configure(p), 3)
+
+            with open(p.config_file, 'a') as f:
+                f.write('# changed\n')
+            p = Project(p.directory)
+            self.assertEqual(self.configure(p), 4)
+            self.assertEqual(self.configure(p), 4)
+
+    def test_missing_inputs(self):
+        from .project import TemporaryProject
+        config = self.config + (
+            "    from configure import tools\n"
+            "    tools.which('frobnicate')\n"
+            "    tools.find_files(os.path.join(build.project.directory, 'missing'))\n"
+        )
+        old_path = tools.PATH
+        with TemporaryProject(config = config, build_dirs = ['build']) as p:
+            bin_dir = path.join(p.directory, 'bin')
+            os.mkdir(bin_dir)
+            os.utime(bin_dir, ns = (1, 1))
+            tools.PATH = [bin_dir]
+            try:
+                self.assertEqual(self.configure(p), 1)
+                self.assertEqual(self.configure(p), 1)
+
+                # Installed after a miss
+                frobnicate = path.join(bin_dir, 'frobnicate')
+                with open(frobnicate, 'w') as f:
+                    f.write('#!/bin/sh\n')
+                os.chmod(frobnicate, 0o755)
+                with p.configure('build', generator_name = 'Makefile') as build:
+                    self.assertFalse(build.up_to_date)
+                    build.generate()
+                self.assertEqual(self.configure(p), 2)
+
+                # Created after being searched
+                os.mkdir(path.join(p.directory, 'missing'))
+                self.assertEqual(self.configure(p), 3)
+                self.assertEqual(self.configure(p), 3)
+            finally:
+                tools.PATH = old_path
+
+    def test_os_env(self):
+        from .project import TemporaryProject
+        config = self.config + (
+            "    from configure.command import Command\n"
+            "    from configure.target import Target\n"
+            "    t = Target(build, 'out.txt')\n"
+            "    Command(action = 'Touch', command = ['touch', t], target = t, os_env = ['FROB_FLAGS'])\n"
+        )
+        old = os.environ.pop('FROB_FLAGS', None)
+        with TemporaryProject(config = config, build_dirs = ['build']) as p:
+            try:
+                self.assertEqual(self.configure(p), 1)
+                self.assertEqual(self.configure(p), 1)
+                os.environ['FROB_FLAGS'] = '-O2'
+                self.assertEqual(self.configure(p), 2)
+                self.assertEqual(self.configure(p), 2)
+            finally:
+                os.environ.pop('FROB_FLAGS', None)
+                if old is not None:
+                    os.environ['FROB_FLAGS'] = old
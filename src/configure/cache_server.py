@@ -0,0 +1,157 @@
+# -*- encoding: utf-8 -*-
+
+"""Reference server for the remote object cache (see lang/c/object_cache.py).
+
+    python -m configure.cache_server [--host HOST] [--port PORT] DIRECTORY
+
+Entries are stored by key in DIRECTORY:
+
+    GET /KEY    Returns the entry, or 404 when not found
+    PUT /KEY    Stores the request body as the entry
+
+Keys are hexadecimal SHA-1 digests. The server does no authentication and
+should only listen on trusted networks.
+"""
+
+import http.server
+import os
+import re
+import threading
+
+KEY_RE = re.compile(r'^/([0-9a-f]{40})$')
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    # Set by serve()
+    directory = None
+
+    def entry_path(self):
+        match = KEY_RE.match(self.path)
+        if match is None:
+            self.send_error(400, "Invalid key")
+            return None
+        key = match.group(1)
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def do_GET(self):
+        entry = self.entry_path()
+        if entry is None:
+            return
+        try:
+            with open(entry, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        entry = self.entry_path()
+        if entry is None:
+            return
+        size = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(size)
+        os.makedirs(os.path.dirname(entry), exist_ok = True)
+        tmp = '%s.%s' % (entry, threading.get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, entry)
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def server(directory, host = '127.0.0.1', port = 0):
+    """Returns a server storing entries in `directory`, not yet started. The
+    actual port is available with `server.server_address`.
+    """
+    os.makedirs(directory, exist_ok = True)
+    handler = type('Handler', (Handler,), {'directory': os.path.abspath(directory)})
+    return http.server.ThreadingHTTPServer((host, port), handler)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description = "Remote object cache server")
+    parser.add_argument('directory', help = "Where entries are stored")
+    parser.add_argument('--host', default = '127.0.0.1', help = "Listening address")
+    parser.add_argument('--port', type = int, default = 8000, help = "Listening port")
+    args = parser.parse_args()
+    s = server(args.directory, args.host, args.port)
+    print("Serving %s on http://%s:%s" % ((args.directory,) + s.server_address[:2]))
+    try:
+        s.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        s.server_close()
+
+if __name__ == '__main__':
+    main()
+
+
+from unittest import TestCase
+import shutil
+import tempfile
+
+class _(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.server = server(os.path.join(self.tempdir.name, 'remote'))
+        self.url = 'http://%s:%s' % self.server.server_address[:2]
+        self.thread = threading.Thread(target = self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.tempdir.cleanup()
+
+    def test_get_put(self):
+        from .lang.c import object_cache
+        key = 'a' * 40
+        self.assertIsNone(object_cache.remote_get(self.url, key))
+        self.assertTrue(object_cache.remote_put(self.url, key, b'pif'))
+        self.assertEqual(object_cache.remote_get(self.url, key), b'pif')
+        self.assertIsNone(object_cache.remote_get(self.url, '../../etc/passwd'))
+
+    def test_remote_hit(self):
+        from .lang.c import object_cache
+        gcc = shutil.which('gcc')
+        if gcc is None:
+            self.skipTest("gcc not found")
+        d = self.tempdir.name
+        src = os.path.join(d, 'test.c')
+        with open(src, 'w') as f:
+            f.write('int main() { return 0; }\n')
+        for i in range(2):
+            cache_dir = os.path.join(d, 'cache%s' % i)
+            os.makedirs(cache_dir)
+            obj = os.path.join(d, 'test%s.o' % i)
+            exe = os.path.join(d, 'test%s' % i)
+            self.assertEqual(
+                object_cache.build_object(cache_dir, [gcc, '-c', src, '-o', obj], remote = self.url),
+                0
+            )
+            # Same object content, but a different name
+            shutil.copy(os.path.join(d, 'test0.o'), os.path.join(d, 'test.o'))
+            self.assertEqual(
+                object_cache.build_object(
+                    cache_dir,
+                    [gcc, os.path.join(d, 'test.o'), '-o', exe],
+                    output = exe,
+                    remote = self.url,
+                ),
+                0
+            )
+            self.assertTrue(os.access(exe, os.X_OK))
+        self.assertEqual(object_cache.read_stats(os.path.join(d, 'cache0'))['misses'], 2)
+        stats = object_cache.read_stats(os.path.join(d, 'cache1'))
+        self.assertEqual((stats['remote_hits'], stats['misses']), (2, 0))
@@ -17,6 +17,8 @@ class Command(Source):
         '__os_env',
         '__env',
         '__outputs',
+        '__depfile',
+        '__system_include_directories',
     )
 
     def __init__(self,
@@ -27,7 +29,9 @@ class Command(Source):
                  additional_outputs = tuple(),
                  working_directory = None,
                  os_env = [],
-                 env = {}):
+                 env = {},
+                 depfile = None,
+                 system_include_directories = ()):
         self.__action = action
         self.__command = list(self.__make_flat(command))
 
@@ -46,6 +50,13 @@ class Command(Source):
         assert isinstance(target, Target)
         self.__outputs = (target,) + tuple(additional_outputs)
 
+        # Makefile of header dependencies written by the command itself
+        if depfile is not None:
+            depfile = PATH.absolute(target.build.directory, depfile)
+        self.__depfile = depfile
+        # Searched after include directories when scanning headers
+        self.__system_include_directories = tuple(system_include_directories)
+
         target.dependencies.extend(inputs)
         seen = set(el.path for el in target.dependencies)
         seen.update(el.path for el in self.__outputs)
@@ -75,6 +86,20 @@ class Command(Source):
     def outputs(self):
         return self.__outputs
 
+    @property
+    def depfile(self):
+        """Absolute path of the header dependencies written by the command
+        (in the Makefile syntax), or None.
+        """
+        return self.__depfile
+
+    @property
+    def system_include_directories(self):
+        """Compiler include directories to search when scanning the
+        headers of the command sources.
+        """
+        return self.__system_include_directories
+
     @property
     def original_command(self):
         return self.__command
@@ -9,17 +9,21 @@ from .target import Target
 from .node import Node
 
 class IncludeDirectory(Node):
+    __slots__ = ()
+
     def __init__(self, build, dir, *args, **kw):
         kw['is_directory'] = True
         super().__init__(build, dir, *args, **kw)
 
 class LibraryTarget(Target):
+    __slots__ = ('shared',)
+
     def __init__(self, build, path, shared):
         self.shared = shared
         super().__init__(build, path)
 
 class ExecutableTarget(Target):
-    pass
+    __slots__ = ()
 
 
 class Compiler:
@@ -165,6 +165,13 @@ class Env:
     def __setattr__(self, key, value):
         return self.__setitem__(key, value)
 
+    def __getstate__(self):
+        return (self.__vars, self.__parent)
+
+    def __setstate__(self, state):
+        object.__setattr__(self, '_Env__vars', state[0])
+        object.__setattr__(self, '_Env__parent', state[1])
+
     def __iter__(self):
         for item in self.__dict.items():
             yield item
@@ -254,3 +261,9 @@ class _(TestCase):
         self.assertEqual(e.a, 12)
         self.assertEqual(e.b, 52)
         self.assertEqual(e.c, 62)
+
+    def test_pickle(self):
+        parent = Env({'a': 1})
+        e = pickle.loads(pickle.dumps(Env({'b': [2]}, parent = parent)))
+        self.assertEqual(e['b'], [2])
+        self.assertEqual(e['a'], 1)
@@ -0,0 +1,362 @@
+# -*- encoding: utf-8 -*-
+
+import concurrent.futures
+import heapq
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from . import path
+from . import schedule
+from . import tools
+from . import trace
+from .command import Command
+from .target import Target
+
+class Job:
+    """Commands building the same target."""
+
+    __slots__ = (
+        'key', 'commands', 'entry', 'hash', 'outputs', 'inputs',
+        'sources', 'depfiles', 'dependencies', 'dependents', 'waiting', 'priority',
+    )
+
+    def __init__(self, key, commands, entry, hash):
+        self.key = key
+        self.commands = commands
+        self.entry = entry
+        self.hash = hash
+        self.outputs = tools.unique(
+            o.path for o in sum((cmd.outputs for cmd in commands), ())
+        )
+        self.inputs = []
+        self.sources = []
+        self.depfiles = []
+        self.dependencies = set()
+        self.dependents = []
+        self.waiting = 0
+        self.priority = 0
+
+    def __lt__(self, other):
+        return (-self.priority, self.key) < (-other.priority, other.key)
+
+class Executor:
+    """Execute the commands of a build in parallel.
+
+    Jobs are started as soon as the jobs building their inputs are done,
+    longest command chains first (see schedule.py). A job is skipped when
+    its outputs are newer than its inputs (including C/C++ headers) and its
+    command did not change since its last run, as recorded in the build
+    state file.
+    """
+
+    def __init__(self, build, jobs = None):
+        self.build = build
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.state_file = path.join(build.directory, '.build-state')
+        self.__headers = {}
+        self.__header_cache = None
+
+    def collect(self):
+        """Returns the jobs of the build, indexed by key."""
+        from .compiler import IncludeDirectory
+        from .lang.c.compiler import CSource
+        from .lang.cxx.compiler import CXXSource
+        from .generators import run_command
+
+        commands = {}
+        def visit(node):
+            if isinstance(node, (Target, Command)) and node.build is not self.build:
+                return False
+            if isinstance(node, Command):
+                commands.setdefault(node.target.path, []).append(node)
+        self.build.visit(visit)
+
+        jobs = {}
+        producers = {}
+        for target_path, cmds in commands.items():
+            cmds = tools.unique(cmds)
+            key = cmds[0].target.relative_path(self.build.directory)
+            entry = self.build.command_manifest_entry(cmds)
+            job = Job(key, cmds, entry, run_command.entry_hash(entry))
+            for cmd in cmds:
+                if cmd.depfile is not None:
+                    job.depfiles.append((cmd.depfile, cmd.working_directory))
+                for input in cmd.dependencies + cmd.target.dependencies:
+                    if isinstance(input, Command):
+                        continue
+                    job.inputs.append(input.path)
+                    if cmd.depfile is None and isinstance(input, (CSource, CXXSource)):
+                        job.sources.append((
+                            input.path,
+                            tuple(d.path for d in cmd.find_instances(IncludeDirectory)) +
+                            cmd.system_include_directories,
+                        ))
+            job.inputs = tools.unique(job.inputs)
+            jobs[key] = job
+            for output in job.outputs:
+                producers[output] = job
+
+        for job in jobs.values():
+            for input in job.inputs:
+                producer = producers.get(input)
+                if producer is not None and producer is not job:
+                    job.dependencies.add(producer)
+            for dep in job.dependencies:
+                dep.dependents.append(job)
+            job.waiting = len(job.dependencies)
+
+        priorities = schedule.priorities(
+            dict((job.key, [d.key for d in job.dependencies]) for job in jobs.values()),
+            schedule.load_durations(self.build),
+        )
+        for job in jobs.values():
+            job.priority = priorities[job.key]
+        return jobs
+
+    def headers(self, source, include_directories):
+        key = (source, include_directories)
+        res = self.__headers.get(key)
+        if res is None:
+            from .generators.find_dependencies import IncludeIndex, scan_file
+            # Not shared between sources: headers may have been generated
+            # since (listings are still cached with the header cache).
+            res = self.__headers[key] = scan_file(
+                source,
+                list(include_directories),
+                self.__header_cache,
+                index = IncludeIndex(self.__header_cache)
+            )
+        return res
+
+    def is_stale(self, job, state):
+        if state.get(job.key) != job.hash:
+            tools.debug("Command of", job.key, "changed")
+            return True
+        try:
+            oldest = min(os.stat(o).st_mtime_ns for o in job.outputs)
+        except OSError:
+            tools.debug("Missing output for", job.key)
+            return True
+        inputs = list(job.inputs)
+        for source, include_directories in job.sources:
+            inputs.extend(self.headers(source, include_directories))
+        from .generators.find_dependencies import read_depfile
+        for depfile, working_directory in job.depfiles:
+            try:
+                inputs.extend(
+                    path.join(working_directory, p) for p in read_depfile(depfile)
+                )
+            except OSError:
+                tools.debug("Missing header dependencies of", job.key)
+                return True
+        for input in inputs:
+            try:
+                if os.stat(input).st_mtime_ns > oldest:
+                    tools.debug(job.key, "is older than", input)
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def run_job(self, job):
+        """Run the commands of a job, returns its status and output."""
+        start = time.time()
+        output = []
+        for cmd in job.entry:
+            env = {}
+            if 'PATH' in os.environ:
+                env['PATH'] = os.environ['PATH']
+            env.update(cmd['env'])
+            output.append(' '.join(cmd['command']) + '\n')
+            cmd_start = time.time()
+            try:
+                p = subprocess.Popen(
+                    cmd['command'],
+                    cwd = cmd['cwd'],
+                    env = env,
+                    stdin = subprocess.DEVNULL,
+                    stdout = subprocess.PIPE,
+                    stderr = subprocess.STDOUT,
+                )
+            except OSError as e:
+                output.append('%s\n' % e)
+                return 127, ''.join(output)
+            out, _ = p.communicate()
+            if trace.enabled(self.build):
+                trace.record(
+                    self.build, cmd_start, time.time(), p.pid,
+                    cmd['action'], cmd['target'], p.returncode
+                )
+            output.append(out.decode('utf8', errors = 'replace'))
+            if p.returncode != 0:
+                return p.returncode, ''.join(output)
+        schedule.record_duration(self.build, job.key, time.time() - start)
+        return 0, ''.join(output)
+
+    def load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f, sort_keys = True, indent = 0)
+        os.replace(tmp, self.state_file)
+
+    def run(self):
+        """Execute the build, returns 0 on success."""
+        if self.build.dependencies:
+            status = Executor(self.build.dependencies_build, jobs = self.jobs).run()
+            if status != 0:
+                return status
+
+        from .generators import find_dependencies
+        self.__header_cache = find_dependencies.HeaderCache(
+            path.join(self.build.directory, find_dependencies.CACHE_FILENAME),
+            preload = True
+        )
+        try:
+            return self.__run()
+        finally:
+            self.__header_cache.close()
+            self.__header_cache = None
+
+    def __run(self):
+        jobs = self.collect()
+        state = self.load_state()
+        ready = [job for job in jobs.values() if not job.waiting]
+        heapq.heapify(ready)
+        running = {}
+        done = 0
+        ran = 0
+        status = 0
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as pool:
+            while ready or running:
+                while ready and len(running) < self.jobs and status == 0:
+                    job = heapq.heappop(ready)
+                    if not self.is_stale(job, state):
+                        done += 1
+                        self.__release(job, ready)
+                        continue
+                    for output in job.outputs:
+                        os.makedirs(path.dirname(output), exist_ok = True)
+                    running[pool.submit(self.run_job, job)] = job
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(
+                    running,
+                    return_when = concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    job = running.pop(future)
+                    job_status, output = future.result()
+                    done += 1
+                    ran += 1
+                    tools.status(
+                        '[%d/%d]' % (done, len(jobs)),
+                        job.entry[0]['action'],
+                        job.key,
+                    )
+                    sys.stdout.write(output)
+                    sys.stdout.flush()
+                    if job_status != 0:
+                        tools.error("Failed to build", job.key)
+                        status = status or job_status
+                        state.pop(job.key, None)
+                        continue
+                    state[job.key] = job.hash
+                    self.__release(job, ready)
+        self.save_state(state)
+        if status == 0 and done != len(jobs):
+            # Jobs waiting on each other (dependency cycle)
+            for job in jobs.values():
+                if job.waiting:
+                    tools.error("Cannot build", job.key, "(waiting on a dependency cycle)")
+            return 1
+        if status == 0 and not ran:
+            tools.verbose("Nothing to do in", self.build.directory)
+        return status
+
+    def __release(self, job, ready):
+        for dependent in job.dependents:
+            dependent.waiting -= 1
+            if not dependent.waiting:
+                heapq.heappush(ready, dependent)
+
+
+from unittest import TestCase
+from .project import TemporaryProject
+import textwrap
+
+class _(TestCase):
+
+    cfg = textwrap.dedent(
+        """
+        def main(bld):
+            a = bld.fs.copy(bld.project.directory + '/a.txt', 'b.txt')
+            bld.fs.copy(a, 'c.txt')
+        """
+    )
+
+    def test_execute(self):
+        with TemporaryProject(self.cfg, build_dirs = ['pif']) as p:
+            with open(path.join(p.directory, 'a.txt'), 'w') as f:
+                f.write('pif')
+            with p.configure('pif', generator_name = 'Makefile') as bld:
+                executor = Executor(bld, jobs = 2)
+                self.assertEqual(len(executor.collect()), 2)
+                self.assertEqual(executor.run(), 0)
+                with open(path.join(p.directory, 'pif', 'c.txt')) as f:
+                    self.assertEqual(f.read(), 'pif')
+                mtime = os.stat(path.join(p.directory, 'pif', 'c.txt')).st_mtime_ns
+                self.assertEqual(executor.run(), 0)
+                self.assertEqual(
+                    mtime,
+                    os.stat(path.join(p.directory, 'pif', 'c.txt')).st_mtime_ns
+                )
+
+    def test_execute_cycle(self):
+        with TemporaryProject(self.cfg, build_dirs = ['pif']) as p:
+            with open(path.join(p.directory, 'a.txt'), 'w') as f:
+                f.write('pif')
+            with p.configure('pif', generator_name = 'Makefile') as bld:
+                executor = Executor(bld)
+                jobs = executor.collect()
+                b, c = jobs['b.txt'], jobs['c.txt']
+                b.dependencies.add(c)
+                c.dependents.append(b)
+                b.waiting += 1
+                executor.collect = lambda: jobs
+                self.assertEqual(executor.run(), 1)
+                self.assertFalse(path.exists(path.join(p.directory, 'pif', 'c.txt')))
+
+    def test_priorities(self):
+        with TemporaryProject(self.cfg, build_dirs = ['pif']) as p:
+            with p.configure('pif', generator_name = 'Makefile') as bld:
+                schedule.record_duration(bld, 'b.txt', 3)
+                schedule.record_duration(bld, 'c.txt', 2)
+                jobs = Executor(bld).collect()
+                self.assertEqual(jobs['b.txt'].priority, 5)
+                self.assertEqual(jobs['c.txt'].priority, 2)
+
+    def test_execute_stale(self):
+        with TemporaryProject(self.cfg, build_dirs = ['pif']) as p:
+            src = path.join(p.directory, 'a.txt')
+            with open(src, 'w') as f:
+                f.write('pif')
+            with p.configure('pif', generator_name = 'Makefile') as bld:
+                executor = Executor(bld)
+                self.assertEqual(executor.run(), 0)
+                time.sleep(0.01)
+                with open(src, 'w') as f:
+                    f.write('paf')
+                self.assertEqual(executor.run(), 0)
+                with open(path.join(p.directory, 'pif', 'c.txt')) as f:
+                    self.assertEqual(f.read(), 'paf')
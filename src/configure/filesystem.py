@@ -30,6 +30,7 @@ from .target import Target
 from .node import Node
 
 from . import path
+from . import tools
 
 class GenerateCommand(Command):
     @property
@@ -130,6 +131,7 @@ class Filesystem:
                 dest = src
         commands = []
         for root, dirs, files in os.walk(src):
+            tools.record_input(root)
             dest_dir = path.join(dest, path.relative(root, start = src))
             for file in files:
                 commands.append(self.copy(os.path.join(root, file), dest_dir = dest_dir))
@@ -1,5 +1,174 @@
 # -*- encoding: utf-8 -*-
 
+import filecmp
+import hashlib
+import os
+
+from . import path
+from . import tools
+
+class Writer:
+    """Buffered writer of a generated file.
+
+    Chunks are buffered and flushed to a temporary file, which replaces the
+    generated file when closed, only if the content changed. The column of
+    the current line is tracked to wrap long lines (see `continuation()`).
+    """
+
+    # Column of escaped line breaks
+    width = 78
+    # Size of the buffer flushed to the file
+    buffer_size = 64 * 1024
+
+    def __init__(self, filename, digest = None, name = None):
+        """Open a writer of `filename`.
+
+        optional arguments:
+
+            digest: The known sha1 of the current file content, to avoid
+                    comparing the content of files.
+            name: Name of the file in status messages (not displayed when
+                  None).
+        """
+        self.filename = filename
+        self.expected_digest = digest
+        self.name = name
+        self.tmp = '%s.%s.tmp' % (filename, os.getpid())
+        self.file = open(self.tmp, 'wb')
+        self.hash = hashlib.sha1()
+        self.buffer = []
+        self.buffered = 0
+        self.column = 0
+        self.written = None
+
+    def write(self, text):
+        if not text:
+            return
+        self.buffer.append(text)
+        self.buffered += len(text)
+        newline = text.rfind('\n')
+        if newline < 0:
+            self.column += len(text) + 7 * text.count('\t')
+        else:
+            line = text[newline + 1:]
+            self.column = len(line) + 7 * line.count('\t')
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def continuation(self, item, indent = '  '):
+        """Write `item` on a new line, the line break being escaped by a
+        backslash aligned on the `width` column.
+        """
+        self.write((self.width - self.column) * ' ' + '\\\n' + indent + item)
+
+    def flush(self):
+        data = ''.join(self.buffer).encode('utf8')
+        self.hash.update(data)
+        self.file.write(data)
+        self.buffer = []
+        self.buffered = 0
+
+    @property
+    def digest(self):
+        """The sha1 of the content written so far."""
+        return self.hash.hexdigest()
+
+    def close(self):
+        """Replace the generated file when changed, returns True when
+        written.
+        """
+        self.flush()
+        self.file.close()
+        is_new = not os.path.exists(self.filename)
+        if is_new:
+            changed = True
+        elif self.expected_digest is not None:
+            changed = self.digest != self.expected_digest
+        else:
+            changed = not filecmp.cmp(self.tmp, self.filename, shallow = False)
+        if changed:
+            os.replace(self.tmp, self.filename)
+            if self.name is not None:
+                tools.verbose(is_new and "Create" or "Update", self.name)
+        else:
+            os.unlink(self.tmp)
+        self.written = changed
+        return changed
+
+    def abort(self):
+        """Close without writing the generated file."""
+        self.file.close()
+        os.unlink(self.tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        if type_ is None:
+            self.close()
+        else:
+            self.abort()
+
+class Fragments:
+    """Fragments of a generated file, written in a directory.
+
+    The content hash of written fragments is kept in an index file, so that
+    only fragments which content changed are written again. Fragments not
+    written anymore are removed when closed.
+    """
+
+    def __init__(self, directory, project_directory = None):
+        self.directory = directory
+        self.project_directory = project_directory
+        self.index_file = path.join(directory, 'index')
+        self.index = {}
+        self.writers = []
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as f:
+                for line in f:
+                    digest, _, name = line.rstrip('\n').partition(' ')
+                    self.index[name] = digest
+        elif not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def open(self, name):
+        """Returns a `Writer` of the fragment `name`."""
+        filename = path.join(self.directory, name)
+        writer = Writer(
+            filename,
+            digest = self.index.get(name),
+            name = self.project_directory and path.relative(
+                filename,
+                start = self.project_directory
+            ),
+        )
+        self.writers.append((name, writer))
+        return writer
+
+    @property
+    def files(self):
+        """Paths of the fragments written, in order."""
+        return [writer.filename for name, writer in self.writers]
+
+    def close(self):
+        index = dict((name, writer.digest) for name, writer in self.writers)
+        for name in self.index:
+            if name not in index:
+                tools.debug("Removing obsolete fragment", name)
+                if os.path.exists(path.join(self.directory, name)):
+                    os.unlink(path.join(self.directory, name))
+        tools.write_if_changed(
+            self.index_file,
+            ''.join('%s %s\n' % (index[name], name) for name in sorted(index))
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        if type_ is None:
+            self.close()
+
 class Generator:
     """Generator base class.
 
@@ -45,3 +214,50 @@ class Generator:
     def begin(self): pass
     def end(self): pass
 
+    @property
+    def outputs(self):
+        """Files written by the generator. When empty, the build is always
+        regenerated (see build_cache.py).
+        """
+        return []
+
+    def open(self, filename):
+        """Returns a `Writer` of a generated file."""
+        return Writer(
+            filename,
+            name = path.relative(filename, start = self.project.directory)
+        )
+
+    def write_file(self, filename, content):
+        """Write a generated file when its content changed, returns True when
+        written.
+        """
+        with self.open(filename) as out:
+            out.write(content)
+        return out.written
+
+    def fragments(self, directory):
+        """Returns the `Fragments` of a generated file written in
+        `directory`.
+        """
+        return Fragments(directory, project_directory = self.project.directory)
+
+    @property
+    def native_commands(self):
+        """True when commands should be written directly in build rules
+        (see the NATIVE_COMMANDS build variable).
+        """
+        return bool(self.build.env.get('NATIVE_COMMANDS', False))
+
+    def is_native_command(self, command, working_directory):
+        """True when the command can be run directly by the build system
+        from `working_directory'. Commands that need a specific environment or
+        working directory are run by configure.py scripts.
+        """
+        return (
+            self.native_commands and
+            not command.env and
+            not command.os_env and
+            command.working_directory == working_directory
+        )
+
@@ -2,3 +2,4 @@
 
 from .makefile import Makefile
 from .tup import Tup
+from .ninja import Ninja
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- encoding: utf8 -*-
+
+"""Run build commands through a long-lived local server.
+
+Generated build rules call this script instead of starting a full python
+interpreter for every command script:
+
+    python -S command_server.py SOCKET SCRIPT [ARGS...]
+
+The client connects to the server listening on SOCKET (spawning it when
+needed), hands it its standard file descriptors, working directory,
+environment and arguments, and exits with the status of SCRIPT. The server
+forks for each request and executes SCRIPT in the child, so that the interpreter
+startup and standard library imports are paid only once per build.
+
+When the server cannot be reached, SCRIPT is run by the client itself.
+
+Note that the client side should stay cheap to load: only builtin modules are
+imported at the top level (the `socket' module alone would double the
+interpreter startup time).
+"""
+
+import _socket
+import marshal
+import os
+import sys
+
+# Seconds the server waits for a new request before exiting.
+IDLE_TIMEOUT = 600
+
+# Seconds the client waits for a freshly spawned server.
+SPAWN_TIMEOUT = 2
+
+# Modules imported by the server before forking, so that command scripts
+# find them already loaded.
+PRELOADED_MODULES = ['subprocess', 'threading', 'traceback']
+
+def socket_path(build_directory):
+    """Returns the server socket path for a build directory.
+
+    Unix socket paths are limited in size, they are stored in a private
+    temporary directory instead of the build directory.
+    """
+    import hashlib
+    import tempfile
+    digest = hashlib.md5(os.path.abspath(build_directory).encode('utf8'))
+    return os.path.join(
+        tempfile.gettempdir(),
+        'configure.py-%s' % os.getuid(),
+        'runner-%s.sock' % digest.hexdigest()[:16],
+    )
+
+def _is_private(directory):
+    """True when `directory` is a directory (not a link) owned by the current
+    user, with mode 0700: the socket and what is sent through it cannot be
+    reached by other users.
+    """
+    try:
+        st = os.lstat(directory)
+    except OSError:
+        return False
+    # S_IFDIR | 0o700, without importing the `stat' module
+    return st.st_uid == os.getuid() and st.st_mode & 0o170777 == 0o040700
+
+def is_available():
+    """True when the command server can be used on this platform."""
+    return hasattr(_socket, 'AF_UNIX') and hasattr(_socket.socket, 'sendmsg')
+
+# Size of a file descriptor in ancillary data.
+_FD_SIZE = 4
+
+def _send(sock, obj, fds = ()):
+    data = marshal.dumps(obj)
+    header = len(data).to_bytes(4, 'little')
+    if fds:
+        sock.sendmsg(
+            [header + data],
+            [(
+                _socket.SOL_SOCKET,
+                _socket.SCM_RIGHTS,
+                b''.join(fd.to_bytes(_FD_SIZE, sys.byteorder) for fd in fds),
+            )]
+        )
+    else:
+        sock.sendall(header + data)
+
+def _recv_exactly(sock, size, chunks):
+    received = sum(len(c) for c in chunks)
+    while received < size:
+        chunk = sock.recv(size - received)
+        if not chunk:
+            raise EOFError("Connection closed")
+        chunks.append(chunk)
+        received += len(chunk)
+    return b''.join(chunks)
+
+def _recv(sock, max_fds = 0):
+    fds = []
+    if max_fds:
+        data, ancdata, flags, addr = sock.recvmsg(
+            4096,
+            _socket.CMSG_LEN(max_fds * _FD_SIZE)
+        )
+        for level, type_, cmsg_data in ancdata:
+            if level == _socket.SOL_SOCKET and type_ == _socket.SCM_RIGHTS:
+                fds.extend(
+                    int.from_bytes(cmsg_data[i:i + _FD_SIZE], sys.byteorder)
+                    for i in range(0, len(cmsg_data) - _FD_SIZE + 1, _FD_SIZE)
+                )
+        if not data:
+            raise EOFError("Connection closed")
+        chunks = [data]
+    else:
+        chunks = []
+    header = _recv_exactly(sock, 4, chunks)
+    size = int.from_bytes(header[:4], 'little')
+    data = _recv_exactly(sock, size + 4, [header])
+    return marshal.loads(data[4:]), fds
+
+def _exit_status(code):
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file = sys.stderr)
+    return 1
+
+def run_script(argv):
+    """Run a python script as __main__ and returns its exit status."""
+    sys.argv = list(argv)
+    try:
+        with open(argv[0], 'rb') as f:
+            code = compile(f.read(), argv[0], 'exec')
+        exec(code, {'__name__': '__main__', '__file__': argv[0]})
+        status = 0
+    except SystemExit as e:
+        status = _exit_status(e.code)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        status = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return status
+
+###############################################################################
+# Server side
+
+def _watch_client(conn):
+    """Kill the command when the client goes away (interrupted build)."""
+    import signal
+    try:
+        conn.recv(1)
+    except OSError:
+        pass
+    os.killpg(0, signal.SIGTERM)
+
+def _handle(conn):
+    import signal
+    import threading
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    request, fds = _recv(conn, max_fds = 3)
+    if request.get('version') != sys.hexversion or len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        _send(conn, None)
+        return
+    for i, fd in enumerate(fds):
+        os.dup2(fd, i)
+        os.close(fd)
+    os.setpgid(0, 0)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    watcher = threading.Thread(target = _watch_client, args = (conn,))
+    watcher.daemon = True
+    watcher.start()
+    status = run_script(request['argv'])
+    _send(conn, status)
+
+def serve(path, idle_timeout = IDLE_TIMEOUT):
+    """Serve requests on the unix socket `path` until idle for too long."""
+    import importlib
+    import signal
+    import socket
+    for name in PRELOADED_MODULES:
+        importlib.import_module(name)
+
+    os.chdir('/')
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode = 0o700, exist_ok = True)
+    if not _is_private(directory):
+        raise Exception("'%s' is not a private directory of the current user" % directory)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if os.path.exists(path):
+        os.unlink(path)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    inode = os.stat(path).st_ino
+    server.listen(128)
+    server.settimeout(idle_timeout)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            conn.settimeout(None)
+            if os.fork() == 0:
+                server.close()
+                try:
+                    _handle(conn)
+                finally:
+                    os._exit(0)
+            conn.close()
+    finally:
+        server.close()
+        try:
+            if os.stat(path).st_ino == inode:
+                os.unlink(path)
+        except OSError:
+            pass
+
+###############################################################################
+# Client side
+
+def _connect(path):
+    if not _is_private(os.path.dirname(path)):
+        return None
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def _spawn_server(path):
+    import subprocess
+    subprocess.Popen(
+        [sys.executable, '-S', os.path.abspath(__file__), '--serve', path],
+        stdin = subprocess.DEVNULL,
+        stdout = subprocess.DEVNULL,
+        stderr = subprocess.DEVNULL,
+        close_fds = True,
+        start_new_session = True,
+    )
+
+def _connect_or_spawn(path):
+    sock = _connect(path)
+    if sock is not None:
+        return sock
+    if os.path.lexists(os.path.dirname(path)) and not _is_private(os.path.dirname(path)):
+        # Owned by someone else, the server would refuse it as well
+        return None
+    import time
+    _spawn_server(path)
+    deadline = time.time() + SPAWN_TIMEOUT
+    delay = 0.005
+    while time.time() < deadline:
+        time.sleep(delay)
+        sock = _connect(path)
+        if sock is not None:
+            return sock
+        delay = min(delay * 2, 0.1)
+    return None
+
+def run(path, argv):
+    """Run the script `argv[0]` through the server, returns the exit status."""
+    sock = None
+    status = None
+    try:
+        sock = _connect_or_spawn(path)
+        if sock is not None:
+            _send(
+                sock,
+                {
+                    'version': sys.hexversion,
+                    'argv': list(argv),
+                    'cwd': os.getcwd(),
+                    'env': dict(os.environ),
+                },
+                fds = (0, 1, 2),
+            )
+            status, _ = _recv(sock)
+    except (OSError, EOFError, ValueError):
+        status = None
+    finally:
+        if sock is not None:
+            sock.close()
+    if status is None:
+        # Server unavailable: fallback to the script itself.
+        status = run_script(argv)
+    return status
+
+def main(argv):
+    if len(argv) == 3 and argv[1] == '--serve':
+        serve(argv[2])
+        return 0
+    if len(argv) < 3:
+        print(
+            "usage: %s SOCKET SCRIPT [ARGS...]" % argv[0],
+            "       %s --serve SOCKET" % argv[0],
+            sep = '\n',
+            file = sys.stderr
+        )
+        return 2
+    return run(argv[1], argv[2:])
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv))
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+from unittest import TestCase
+
+class _(TestCase):
+
+    def test_private_directory(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as d:
+            directory = os.path.join(d, 'sockets')
+            path = os.path.join(directory, 'runner.sock')
+            self.assertFalse(_is_private(directory))
+            os.mkdir(directory, 0o755)
+            os.chmod(directory, 0o755)
+            self.assertFalse(_is_private(directory))
+            self.assertIsNone(_connect(path))
+            self.assertIsNone(_connect_or_spawn(path))
+            self.assertFalse(os.path.exists(path))
+            os.chmod(directory, 0o700)
+            self.assertTrue(_is_private(directory))
+            link = os.path.join(d, 'link')
+            os.symlink(directory, link)
+            self.assertFalse(_is_private(link))
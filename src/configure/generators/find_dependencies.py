@@ -2,13 +2,13 @@
 # -*- encoding: utf8 -*-
 
 import argparse
+import json
+import os
 import re
-import subprocess
+import sqlite3
+import time
 from os.path import abspath, relpath, dirname, join, exists, isdir, isfile
 import multiprocessing
-import threading
-import time
-import queue
 import sys
 
 def parse_args():
@@ -18,9 +18,9 @@ def parse_args():
 
     parser.add_argument(
         'sources',
-        action = 'append',
+        nargs = '*',
         default = [],
-        help = "Source file to inspect",
+        help = "Source files to inspect",
     )
 
     parser.add_argument(
@@ -32,8 +32,11 @@ def parse_args():
     )
 
     parser.add_argument(
-        '--preprocessor',
-        help = 'Prepend system includes used by this preprocessor (usually a binary called "cpp")',
+        '--system-include-directory',
+        help = 'System include directories, searched after include directories',
+        default = [],
+        action = 'append',
+        dest = 'system_include_directories',
     )
 
     parser.add_argument(
@@ -58,11 +61,36 @@ def parse_args():
         help = "Generate Makefile dependencies",
         action = 'store_true',
     )
+    parser.add_argument(
+        '--cache',
+        help = "Header cache file (see HeaderCache)",
+        action = 'store'
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        help = "Number of processes scanning a batch (default to the number of CPUs for large batches)",
+        type = int,
+        default = 0,
+    )
+    parser.add_argument(
+        '--batch',
+        help = "Generate the Makefile dependencies of all targets listed in a JSON file (see scan_batch())",
+        action = 'store'
+    )
 
-    return parser.parse_args()
+    return parser.parse_intermixed_args()
 
 INCLUDE_RE = re.compile(b"#\s*include\s*([\"<])(\S+)[\">]\s*$")
 
+# Default header cache filename, in the build directory
+CACHE_FILENAME = '.header-cache'
+
+# Batches with fewer sources are scanned in one process by default
+PARALLEL_SCAN_MIN_SOURCES = 64
+
+# Directory listings are not cached when the directory changed in the last
+# seconds (a file added in the same mtime tick would not be seen).
+RECENT_DIRECTORY_DELAY = 2
 
 def _find_matches(source):
     res = []
@@ -74,139 +102,582 @@ def _find_matches(source):
                 continue
             m = INCLUDE_RE.match(line)
             if m:
-                res.append((m.group(1), m.group(2).decode('utf8')))
+                res.append((m.group(1).decode('utf8'), m.group(2).decode('utf8')))
     return res
 
-def _resolve_local_include(source_dir, include_directories, include):
+def list_files(directory):
+    """Returns the names of files in a directory (empty when it does not
+    exist).
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return [e.name for e in entries if e.is_file()]
+    except OSError:
+        return []
+
+class HeaderCache:
+    """Include directives of scanned files, stored in a sqlite database.
+
+    Entries are keyed by absolute path and are valid as long as the file
+    (mtime, size) did not change: unchanged files are only stat()ed. New
+    entries are written when the cache is closed, concurrent scanners
+    sharing the same cache file is fine. With `preload`, all entries are read
+    at once (for scans of many files).
+
+    The files of include directories (see IncludeIndex) are stored as well,
+    valid as long as the directory mtime did not change.
+    """
+
+    def __init__(self, filename, preload = False):
+        self.filename = filename
+        self.db = sqlite3.connect(filename, timeout = 60)
+        try:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS includes ('
+                '  path TEXT PRIMARY KEY,'
+                '  mtime INTEGER,'
+                '  size INTEGER,'
+                '  includes TEXT'
+                ')'
+            )
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS directories ('
+                '  path TEXT PRIMARY KEY,'
+                '  mtime INTEGER,'
+                '  files TEXT'
+                ')'
+            )
+        except sqlite3.Error:
+            self.db.close()
+            raise
+        self.updates = {}
+        self.directory_updates = {}
+        self.hits = 0
+        self.entries = None
+        self.directories = None
+        if preload:
+            self.entries = dict(
+                (row[0], row[1:])
+                for row in self.db.execute('SELECT path, mtime, size, includes FROM includes')
+            )
+            self.directories = dict(
+                (row[0], row[1:])
+                for row in self.db.execute('SELECT path, mtime, files FROM directories')
+            )
+
+    def find_matches(self, source):
+        """Returns the include directives of a file (see `_find_matches()`)."""
+        source = abspath(source)
+        st = os.stat(source)
+        if self.entries is not None:
+            row = self.entries.get(source)
+        else:
+            row = self.db.execute(
+                'SELECT mtime, size, includes FROM includes WHERE path = ?',
+                (source,)
+            ).fetchone()
+        if row is not None and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            self.hits += 1
+            return [tuple(m) for m in json.loads(row[2])]
+        res = _find_matches(source)
+        self.updates[source] = (source, st.st_mtime_ns, st.st_size, json.dumps(res))
+        return res
+
+    def directory_files(self, directory):
+        """Returns the names of files in a directory (see `list_files()`)."""
+        # Not normalized: `a/link/../b` is not `a/b`
+        directory = join(os.getcwd(), directory)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            mtime = -1
+        if self.directories is not None:
+            row = self.directories.get(directory)
+        else:
+            row = self.db.execute(
+                'SELECT mtime, files FROM directories WHERE path = ?',
+                (directory,)
+            ).fetchone()
+        if row is not None and row[0] == mtime:
+            return json.loads(row[1])
+        res = mtime != -1 and list_files(directory) or []
+        if mtime < (time.time() - RECENT_DIRECTORY_DELAY) * 1e9:
+            self.directory_updates[directory] = (directory, mtime, json.dumps(res))
+        return res
+
+    def close(self):
+        try:
+            if self.updates or self.directory_updates:
+                with self.db:
+                    self.db.executemany(
+                        'INSERT OR REPLACE INTO includes VALUES (?, ?, ?, ?)',
+                        self.updates.values()
+                    )
+                    self.db.executemany(
+                        'INSERT OR REPLACE INTO directories VALUES (?, ?, ?)',
+                        self.directory_updates.values()
+                    )
+        except sqlite3.Error as e:
+            # The cache is an optimization, missing entries are scanned again
+            print("Cannot update the header cache", self.filename, ':', e, file = sys.stderr)
+        finally:
+            self.updates = {}
+            self.directory_updates = {}
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+class IncludeIndex:
+    """Files of include directories, listed once with os.scandir(): include
+    resolution is then a dictionary lookup per include directory instead of
+    a stat() call. Directories are listed lazily (`<a/b.h>` lists the `a`
+    subdirectory of include directories), through the header cache when
+    given.
+    """
+
+    def __init__(self, cache = None):
+        self.cache = cache
+        self.directories = {}
+        self.resolved = {}
+
+    def files(self, directory):
+        res = self.directories.get(directory)
+        if res is None:
+            if self.cache is not None:
+                res = self.cache.directory_files(directory)
+            else:
+                res = list_files(directory)
+            res = self.directories[directory] = frozenset(res)
+        return res
+
+    def isfile(self, p):
+        directory, name = os.path.split(p)
+        return name in self.files(directory)
+
+    def resolve(self, include_directories, include):
+        """Returns the path of `include` in the first include directory
+        containing it, or None.
+        """
+        key = (include_directories, include)
+        try:
+            return self.resolved[key]
+        except KeyError:
+            pass
+        res = None
+        for d in include_directories:
+            p = join(d, include)
+            if self.isfile(p):
+                res = p
+                break
+        self.resolved[key] = res
+        return res
+
+def _resolve_local_include(source_dir, include_directories, include, index = None):
     p = join(source_dir, include)
-    if not exists(p):
-        return _resolve_global_includes(include_directories, include)
+    if index is not None:
+        found = index.isfile(p)
+    else:
+        found = exists(p)
+    if not found:
+        return _resolve_global_includes(include_directories, include, index)
     return p
 
-def _resolve_global_includes(include_directories, include):
+def _resolve_global_includes(include_directories, include, index = None):
+    if index is not None:
+        return index.resolve(tuple(include_directories), include)
     for d in include_directories:
         p = join(d, include)
         if isfile(p):
             return p
 
-def _resolve_includes(source, include_directories):
+def _resolve_includes(source, include_directories, cache = None, index = None):
     source_dir = None
     results = set()
-    for c, match in _find_matches(source):
+    if cache is not None:
+        matches = cache.find_matches(source)
+    else:
+        matches = _find_matches(source)
+    for c, match in matches:
         res = None
-        if c == b'"':
+        if c == '"':
             if source_dir is None:
                 source_dir = abspath(dirname(source))
-            res = _resolve_local_include(source_dir, include_directories, match)
-        elif c == b'<':
-            res = _resolve_global_includes(include_directories, match)
+            res = _resolve_local_include(source_dir, include_directories, match, index)
+        elif c == '<':
+            res = _resolve_global_includes(include_directories, match, index)
         else:
             continue
         if res is not None:
             results.add(res)
     return results
 
-class ThreadedIncludeSolver:
-    def __init__(self, source, include_directories):
-        self.seen = set()
-        self.include_directories = include_directories
-        self.end_condition = threading.Condition()
-        self.workers = []
-        self.queue = queue.Queue()
-        self.queue.put(source)
-        self.nb_threads = multiprocessing.cpu_count()
-        for _ in range(self.nb_threads):
-            self.workers.append(threading.Thread(target = self.__work))
-            self.workers[-1].start()
-        self.total = 0
-
-    def __work(self):
-        while 1:
-            el = self.queue.get()
-            if el is None:
-                self.queue.task_done()
-                break
-            results = _resolve_includes(el, self.include_directories)
-            for r in results:
-                if r not in self.seen:
-                    self.seen.add(r)
-                    self.queue.put(r, False)
-            self.queue.task_done()
+# Header cache and include index of worker processes (see
+# ParallelIncludeSolver)
+_worker_cache = None
+_worker_index = None
 
-    @property
-    def result(self):
-        self.queue.join()
-        for i in range(self.nb_threads):
-            self.queue.put(None)
-        for w in self.workers: w.join()
-        return self.seen
+def _init_worker(cache_filename):
+    global _worker_cache, _worker_index
+    if cache_filename is not None:
+        try:
+            _worker_cache = HeaderCache(cache_filename, preload = True)
+        except sqlite3.Error:
+            _worker_cache = None
+    _worker_index = IncludeIndex(_worker_cache)
+
+def _resolve_chunk(files, include_directories):
+    """Resolve the includes of some files in a worker process. Returns the
+    includes of each file and the new header cache entries (written by the
+    main process).
+    """
+    res = [
+        (f, sorted(_resolve_includes(f, list(include_directories), _worker_cache, _worker_index)))
+        for f in files
+    ]
+    updates = ([], [])
+    if _worker_cache is not None:
+        updates = (
+            list(_worker_cache.updates.values()),
+            list(_worker_cache.directory_updates.values()),
+        )
+        _worker_cache.updates = {}
+        _worker_cache.directory_updates = {}
+    return res, updates
+
+class ParallelIncludeSolver:
+    """Resolve the includes of many sources in a pool of processes.
+
+    Files are partitioned in chunks between workers, includes resolved are
+    merged in the `memo` map (keyed by file and include directories, see
+    `IncludeSolver.resolve()`) and newly found headers are resolved in turn.
+    """
+
+    def __init__(self, jobs, cache = None, chunk_size = 32):
+        self.jobs = jobs
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.memo = {}
+
+    def resolve(self, sources):
+        """Resolve the includes of (source, include_directories) pairs, and
+        of all the headers they include.
+        """
+        import concurrent.futures
+        queued = set()
+        pending = []
+        for source, include_directories in sources:
+            key = (source, tuple(include_directories))
+            if key not in self.memo and key not in queued:
+                queued.add(key)
+                pending.append(key)
+        if not pending:
+            return self.memo
+        with concurrent.futures.ProcessPoolExecutor(
+            self.jobs,
+            initializer = _init_worker,
+            initargs = (self.cache and self.cache.filename,),
+        ) as pool:
+            running = {}
+            def submit(keys):
+                by_directories = {}
+                for f, include_directories in keys:
+                    by_directories.setdefault(include_directories, []).append(f)
+                for include_directories, files in by_directories.items():
+                    for i in range(0, len(files), self.chunk_size):
+                        future = pool.submit(
+                            _resolve_chunk,
+                            files[i:i + self.chunk_size],
+                            include_directories
+                        )
+                        running[future] = include_directories
+            submit(pending)
+            while running:
+                done, _ = concurrent.futures.wait(
+                    running,
+                    return_when = concurrent.futures.FIRST_COMPLETED
+                )
+                new = []
+                for future in done:
+                    include_directories = running.pop(future)
+                    results, (updates, directory_updates) = future.result()
+                    if self.cache is not None:
+                        self.cache.updates.update((u[0], u) for u in updates)
+                        self.cache.directory_updates.update(
+                            (u[0], u) for u in directory_updates
+                        )
+                    for f, includes in results:
+                        self.memo[(f, include_directories)] = set(includes)
+                        for include in includes:
+                            key = (include, include_directories)
+                            if key not in self.memo and key not in queued:
+                                queued.add(key)
+                                new.append(key)
+                submit(new)
+        return self.memo
 
 class IncludeSolver:
-    def __init__(self, source, include_directories):
+    def __init__(self, source, include_directories, cache = None, memo = None, index = None):
         self.seen = set()
         self.include_directories = include_directories
+        self.cache = cache
+        self.memo = memo
+        self.index = index
         self.new = {source}
 
+    def resolve(self, source):
+        """Returns the includes of `source`, resolved once per set of include
+        directories when a memo dict is shared between solvers.
+        """
+        if self.memo is None:
+            return _resolve_includes(source, self.include_directories, self.cache, self.index)
+        key = (source, tuple(self.include_directories))
+        res = self.memo.get(key)
+        if res is None:
+            res = self.memo[key] = _resolve_includes(
+                source,
+                self.include_directories,
+                self.cache,
+                self.index
+            )
+        return res
+
     @property
     def result(self):
         while self.new:
             el = self.new.pop()
-            results = _resolve_includes(el, self.include_directories)
+            results = self.resolve(el)
             for r in results:
                 if r not in self.seen:
                     self.seen.add(r)
                     self.new.add(r)
         return self.seen
 
-def scan_file(source, include_directories):
-    import time
-    start = time.time()
-    result = IncludeSolver(source, include_directories).result
-    #print(len(result), "headers found in", time.time() - start, 'secs')
-    return result
+def scan_file(source, include_directories, cache = None, memo = None, index = None):
+    return IncludeSolver(source, include_directories, cache, memo, index).result
+
+def scan_batch(spec, system_include_directories = [], cache = None, jobs = 1):
+    """Returns a list of (target, headers) for each target of a batch spec:
+
+        {"targets": [
+            {"target": "a.o", "sources": ["a.c"], "include_directories": ["."]},
+            ...
+        ]}
+
+    Targets may also list "system_include_directories", searched after the
+    include directories (and before `system_include_directories`). Resolved
+    includes are shared between all the sources, and resolved in `jobs`
+    processes when greater than one (see ParallelIncludeSolver).
+    """
+    targets = []
+    for entry in spec['targets']:
+        include_directories = (
+            entry['include_directories'] +
+            entry.get('system_include_directories', []) +
+            system_include_directories
+        )
+        targets.append((entry['target'], entry['sources'], include_directories))
+    if jobs > 1:
+        memo = ParallelIncludeSolver(jobs, cache).resolve(
+            (source, include_directories)
+            for target, sources, include_directories in targets
+            for source in sources
+        )
+    else:
+        memo = {}
+    index = IncludeIndex(cache)
+    res = []
+    for target, sources, include_directories in targets:
+        headers = set()
+        for source in sources:
+            headers.update(scan_file(source, include_directories, cache, memo, index))
+        res.append((target, headers))
+    return res
+
+DEPFILE_SEPARATOR_RE = re.compile(r'(?<!\\)\s+')
+
+def read_depfile(filename):
+    """Returns the prerequisites of the first rule of a Makefile of header
+    dependencies (as written by `gcc -MD`).
+    """
+    with open(filename) as f:
+        content = f.read().replace('\\\n', ' ')
+    rule = content.split('\n', 1)[0]
+    if ': ' in rule:
+        rule = rule.split(': ', 1)[1]
+    else:
+        rule = rule.partition(':')[2]
+    return [
+        p.replace('\\ ', ' ')
+        for p in DEPFILE_SEPARATOR_RE.split(rule.strip()) if p
+    ]
+
+def write_makefile_rule(out, target, includes):
+    print(target + ":", end = '', file = out)
+    prev = len(target) + 1
+    for include in includes:
+        line = '  %s' % include
+        print(' ' * (78 - prev), '\\\n', line, sep = '', end = '', file = out)
+        prev = len(line)
+    print(file = out)
 
 def main(args):
-    if args.makefile:
+    if args.batch:
+        if not args.output:
+            raise Exception("You should provide an output file")
+    elif args.makefile:
         if not args.target:
             raise Exception("You should provide a target")
 
-    if args.preprocessor:
-        lines = subprocess.check_output(
-            '%s -xc++ -v < /dev/null' % args.preprocessor,
-            shell = True,
-            stderr = subprocess.STDOUT
-        ).decode('utf8').split('\n')
-        for l in (l.strip().split(' ')[0] for l in lines):
-            if l.startswith('/') and isdir(l):
-                args.include_directories.insert(0, l)
-
-    for d in args.include_directories:
+    system_includes = list(args.system_include_directories)
+    include_directories = args.include_directories + system_includes
+
+    for d in include_directories:
         if not isdir(d):
             raise Exception("'%s' is not a valid include directory" % d)
 
-    res = set()
-    for source in args.sources:
-        res.update(
-            relpath(include, start = args.root)
-            for include in scan_file(source, args.include_directories)
-        )
+    cache = None
+    if args.cache:
+        try:
+            cache = HeaderCache(args.cache, preload = bool(args.batch))
+        except sqlite3.Error as e:
+            print("Cannot open the header cache", args.cache, ':', e, file = sys.stderr)
+    try:
+        if args.batch:
+            with open(args.batch) as f:
+                spec = json.load(f)
+            jobs = args.jobs
+            if jobs <= 0:
+                sources = sum(len(entry['sources']) for entry in spec['targets'])
+                jobs = sources >= PARALLEL_SCAN_MIN_SOURCES and multiprocessing.cpu_count() or 1
+            results = scan_batch(spec, system_includes, cache, jobs)
+        else:
+            res = set()
+            index = IncludeIndex(cache)
+            for source in args.sources:
+                res.update(scan_file(source, include_directories, cache, index = index))
+            results = [(args.target, res)]
+    finally:
+        if cache is not None:
+            cache.close()
+    results = [
+        (target, sorted(set(relpath(include, start = args.root) for include in headers)))
+        for target, headers in results
+    ]
 
     if args.output:
         out = open(args.output, 'w')
     else:
         out = sys.stdout
-    if args.makefile:
+    if args.batch:
+        print("Generate header dependencies of %s targets" % len(results))
+        headers = sorted(set(h for target, includes in results for h in includes))
+        for target, includes in results:
+            write_makefile_rule(out, target, includes)
+        # Scan again when a header changes, and do not fail on removed
+        # headers (like the -MP flag of gcc).
+        write_makefile_rule(out, args.output, headers)
+        for header in headers:
+            print('%s:' % header, file = out)
+    elif args.makefile:
         print("Generate header dependencies for", args.target)
-        print(args.target + ":", end = '', file = out)
-        prev = len(args.target) + 1
-        for include in res:
-            line = '  %s' % include
-            print(' ' * (78 - prev), '\\\n', line, sep = '', end = '', file = out)
-            prev = len(line)
-        print(file = out)
+        write_makefile_rule(out, args.target, results[0][1])
     if out != sys.stdout:
         out.close()
 
+from unittest import TestCase
+
+class _(TestCase):
+
+    def test_header_cache(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as d:
+            def write(name, content, mtime = None):
+                with open(join(d, name), 'w') as f:
+                    f.write(content)
+                if mtime is not None:
+                    os.utime(join(d, name), ns = (mtime, mtime))
+            os.mkdir(join(d, 'inc'))
+            write('a.c', '#include "a.h"\n', 1)
+            write('a.h', '#include <b.h>\n', 1)
+            write('inc/b.h', '', 1)
+            cache_file = join(d, CACHE_FILENAME)
+            def scan():
+                with HeaderCache(cache_file) as cache:
+                    res = scan_file(join(d, 'a.c'), [join(d, 'inc')], cache)
+                    return sorted(relpath(p, d) for p in res), cache.hits
+            self.assertEqual(scan(), (['a.h', 'inc/b.h'], 0))
+            self.assertEqual(scan(), (['a.h', 'inc/b.h'], 3))
+            write('a.h', '#include "c.h"\n', 2)
+            write('c.h', '', 2)
+            self.assertEqual(scan(), (['a.h', 'c.h'], 1))
+            self.assertEqual(scan(), (['a.h', 'c.h'], 3))
+
+    def test_scan_batch(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as d:
+            for name, content in [('a.c', '#include "common.h"\n'),
+                                  ('b.c', '#include <common.h>\n#include "b.h"\n'),
+                                  ('common.h', ''),
+                                  ('b.h', '#include "common.h"\n')]:
+                with open(join(d, name), 'w') as f:
+                    f.write(content)
+            spec = {'targets': [
+                {'target': 'a.o', 'sources': [join(d, 'a.c')], 'include_directories': []},
+                {'target': 'b.o', 'sources': [join(d, 'b.c')], 'include_directories': [d]},
+            ]}
+            for jobs in (2, 1):
+                with HeaderCache(join(d, CACHE_FILENAME)) as cache:
+                    res = [(t, sorted(relpath(h, d) for h in headers))
+                           for t, headers in scan_batch(spec, cache = cache, jobs = jobs)]
+                self.assertEqual(res, [('a.o', ['common.h']), ('b.o', ['b.h', 'common.h'])])
+                # The parallel scan filled the cache
+                self.assertEqual(cache.hits, jobs == 1 and 5 or 0)
+
+    def test_include_index(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as d:
+            for name in ('inc1/a.h', 'inc2/a.h', 'inc2/sub/b.h'):
+                os.makedirs(dirname(join(d, name)), exist_ok = True)
+                open(join(d, name), 'w').close()
+            for name in ('inc1', 'inc2', 'inc2/sub'):
+                os.utime(join(d, name), ns = (1, 1))
+            dirs = (join(d, 'inc1'), join(d, 'inc2'))
+            index = IncludeIndex()
+            self.assertEqual(index.resolve(dirs, 'a.h'), join(d, 'inc1', 'a.h'))
+            self.assertEqual(index.resolve(dirs, 'sub/b.h'), join(d, 'inc2', 'sub', 'b.h'))
+            self.assertIsNone(index.resolve(dirs, 'c.h'))
+            self.assertIsNone(index.resolve(dirs, 'missing/c.h'))
+
+            cache_file = join(d, CACHE_FILENAME)
+            with HeaderCache(cache_file) as cache:
+                self.assertIsNone(IncludeIndex(cache).resolve(dirs, 'sub/c.h'))
+                self.assertEqual(len(cache.directory_updates), 2)
+            with HeaderCache(cache_file, preload = True) as cache:
+                self.assertIsNone(IncludeIndex(cache).resolve(dirs, 'sub/c.h'))
+                self.assertEqual(cache.directory_updates, {})
+            # Listings are invalidated by the directory mtime
+            open(join(d, 'inc2/sub/c.h'), 'w').close()
+            with HeaderCache(cache_file) as cache:
+                self.assertEqual(
+                    IncludeIndex(cache).resolve(dirs, 'sub/c.h'),
+                    join(d, 'inc2', 'sub', 'c.h')
+                )
+
+    def test_read_depfile(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as d:
+            with open(join(d, 'a.o.d'), 'w') as f:
+                f.write('a.o: ../a.c ../a\\ b.h \\\n /usr/include/c.h\n../a\\ b.h:\n')
+            self.assertEqual(
+                read_depfile(join(d, 'a.o.d')),
+                ['../a.c', '../a b.h', '/usr/include/c.h']
+            )
+
 if __name__ == '__main__':
     try:
         import coverage
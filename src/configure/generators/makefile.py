@@ -1,6 +1,7 @@
 # -*- encoding: utf-8 -*-
 
-import os
+import hashlib
+import json
 import pipes
 import sys
 
@@ -12,17 +13,39 @@ from ..target import Target
 from ..command import Command
 
 from ..build import command as build_command
+from .. import schedule
+from . import command_server
+from . import find_dependencies
+from . import run_command
+
+def cmd_str(*cmd):
+    return ' '.join(map(pipes.quote, cmd))
 
 class Makefile(Generator):
 
     def __init__(self, **kw):
         Generator.__init__(self, **kw)
         self.makefile = path.join(self.build.directory, 'Makefile')
-        if path.exists(self.makefile):
-            os.unlink(self.makefile)
+        # Header dependencies of all targets (see write_depend_rule())
+        self.depend_spec = path.join(self.build.directory, '.depend.json')
+        self.depend_makefile = path.join(self.build.directory, '.depend.mk')
         self.targets = {}
         self.commands = {}
         self.dependencies = set()
+        self.reduced_graph = None
+        self.command_runner = self.build.env.get(
+            'COMMAND_RUNNER',
+            command_server.is_available()
+        )
+
+    @property
+    def outputs(self):
+        return [
+            self.makefile,
+            self.build.command_manifest,
+            path.join(self.rules_directory, 'index'),
+            self.depend_spec,
+        ]
 
     def __call__(self, node):
         if isinstance(node, Target):
@@ -47,15 +70,10 @@ class Makefile(Generator):
             ).append(node)
 
     def end(self):
-        cmd_str = lambda *cmd, **kw: kw.get('sep', ' ').join(map(pipes.quote, cmd))
-        makefile = '# Generated makefile\n\n'
-        makefile += 'PYTHON=%s\n' % sys.executable
-        makefile += 'MAKE_DEPENDS=$(PYTHON) %s --root %s --makefile' % (
-            path.absolute(path.dirname(__file__), 'find_dependencies.py'),
-            '.'
+        manifest = path.relative(
+            self.build.command_manifest,
+            start = self.build.directory,
         )
-        phony_rules = ['all', 'clean']
-        makefile += '\n.PHONY:\n.PHONY: %s\n' % ' '.join(phony_rules)
 
         #######################################################################
         # Find C/C++ header dependencies
@@ -67,175 +85,237 @@ class Makefile(Generator):
         target_sources = {}
         for p, commands in self.commands.items():
             for cmd in commands:
+                if cmd.depfile is not None:
+                    # Written by the command (see write_command_rule())
+                    continue
                 for input in cmd.target.dependencies:
                     if input in found_c_sources:
                         continue
                     if isinstance(input, (CSource, CXXSource)):
-                        found_c_sources[input] = list(cmd.find_instances(IncludeDirectory))
+                        found_c_sources[input] = (
+                            list(cmd.find_instances(IncludeDirectory)),
+                            cmd.system_include_directories,
+                        )
                         target_sources.setdefault(cmd.target, set()).add(input)
 
-        #######################################################################
-        # Dump 'all' rule
-        makefile += '\n\nall:'
-        prev = len('all:')
-        for target in sorted(self.targets.keys()):
-            assert target not in self.dependencies
-            makefile += (78 - prev) * ' ' + '\\\n  %s' % target
-            prev = len(target) + 2
-        for target in target_sources.keys():
-            depend = target.relative_path(self.build.directory) + '.depend.mk'
-            makefile += (78 - prev) * ' ' + '\\\n  %s' % depend
-            prev = len(depend) + 2
+        # Longest command chains first (make starts prerequisites in order)
+        priorities = schedule.command_priorities(self.build, self.commands)
+        by_priority = lambda key: (-priorities.get(key, 0), key)
+
+        # Prerequisites already reachable through another one are dropped
+        # (see the REDUCE_DEPENDENCIES build variable)
+        self.reduced_graph = None
+        if self.build.env.get('REDUCE_DEPENDENCIES', False):
+            self.reduced_graph = self.build.graph().transitive_reduction()
 
         #######################################################################
-        # Dump 'clean' rule
-        makefile += '\n\nclean:'
-        for target in self.targets.keys():
-            makefile += "\n\t@%s" % cmd_str('rm', '-fv', target)
-        for target in self.dependencies:
-            makefile += "\n\t@%s" % cmd_str('rm', '-fv', target.relative_path(self.build.directory))
+        # Rules are written in a fragment per target directory (see
+        # Generator.fragments()), so that only changed rules are rewritten.
+        command_keys = {}
+        for key in sorted(self.commands.keys(), key = by_priority):
+            command_keys.setdefault(path.dirname(key), []).append(key)
 
-        # XXX Dependencies are always built ...
-        for target in target_sources.keys():
-            depend = target.relative_path(self.build.directory) + '.depend.mk'
-            makefile += "\n\t@%s" % cmd_str('rm', '-fv', depend)
-        count = len(self.targets) + len(self.dependencies) #+ len(target_sources)
-        makefile += '\n\t@sh -c "echo \'%s targets removed\'"' % count
+        manifest_entries = {}
+        with self.fragments(self.rules_directory) as fragments:
+            for dir in sorted(command_keys):
+                with fragments.open(self.fragment_name(dir)) as out:
+                    out.write('# Rules of %s' % (dir or '.'))
+                    for key in command_keys.get(dir, ()):
+                        manifest_entries[key] = self.write_command_rule(
+                            out,
+                            key,
+                            manifest,
+                            priorities
+                        )
+                    out.write('\n')
 
+        self.build.generate_command_manifest(manifest_entries)
 
-        #######################################################################
-        # Dump dependencies rules
-        deps = []
-        if self.build.dependencies:
-            for dep in self.build.dependencies:
-                for target in dep.targets:
-                    deps.append(target.relative_path(self.build.directory))
-            deps_dir = path.relative(
-                self.build.dependencies_directory,
-                start = self.build.directory,
-            )
-            for dep in deps:
-                makefile += '\n\n%s:' % dep
-                makefile += '\n\t@%s' % cmd_str(
-                    self.build.make_program,
-                    '-C',
-                    deps_dir,
-                    path.relative(dep, start = deps_dir),
+        with self.open(self.makefile) as out:
+            self.write_header(out, manifest)
+
+            ###################################################################
+            # Dump 'all' rule
+            out.write('\n\nall:')
+            for target in sorted(self.targets.keys(), key = by_priority):
+                assert target not in self.dependencies
+                out.continuation(target)
+            if target_sources:
+                out.continuation(path.basename(self.depend_makefile))
+
+            ###################################################################
+            # Dump 'clean' rule
+            out.write('\n\nclean:')
+            for target in self.targets.keys():
+                out.write("\n\t@%s" % cmd_str('rm', '-fv', target))
+            for target in self.dependencies:
+                out.write("\n\t@%s" % cmd_str('rm', '-fv', target.relative_path(self.build.directory)))
+
+            # XXX Dependencies are always built ...
+            if target_sources:
+                out.write("\n\t@%s" % cmd_str('rm', '-fv', path.basename(self.depend_makefile)))
+            count = len(self.targets) + len(self.dependencies) #+ len(target_sources)
+            out.write('\n\t@sh -c "echo \'%s targets removed\'"' % count)
+
+            ###################################################################
+            # Dump dependencies rules
+            deps = []
+            if self.build.dependencies:
+                for dep in self.build.dependencies:
+                    for target in dep.targets:
+                        deps.append(target.relative_path(self.build.directory))
+                deps_dir = path.relative(
+                    self.build.dependencies_directory,
+                    start = self.build.directory,
                 )
+                for dep in deps:
+                    out.write('\n\n%s:' % dep)
+                    out.write('\n\t@%s' % cmd_str(
+                        self.build.make_program,
+                        '-C',
+                        deps_dir,
+                        path.relative(dep, start = deps_dir),
+                    ))
 
-        #######################################################################
-        # Dump C/C++ header dependencies rules
-        for target, sources in target_sources.items():
-            target_path = target.relative_path(self.build.directory)
-            depend = target_path + '.depend.mk'
-            makefile += '\n\n%s:' % depend
-            prev = len(depend) + 1
-            for input in sources:
-                p = input.relative_path(self.build.directory)
-                makefile += (78 - prev) * ' ' + '\\\n  %s' %  p
-                prev = len(p) + 2
-            cmd = '@$(MAKE_DEPENDS) -o %s -t %s' % (depend, target_path)
-            makefile += '\n\t' + cmd
-            prev = len(cmd) + 8
+            out.write('\n')
+            for f in fragments.files:
+                out.write('\ninclude %s' % cmd_str(path.relative(f, start = self.build.directory)))
+            out.write('\n')
+
+            if target_sources:
+                self.write_depend_rule(out, target_sources, found_c_sources)
+
+    def write_header(self, out, manifest):
+        out.write('# Generated makefile\n\n')
+        out.write('PYTHON=%s\n' % sys.executable)
+        run_command_args = cmd_str(
+            path.absolute(run_command.__file__),
+            manifest,
+        )
+        if self.command_runner:
+            out.write('RUN_COMMAND=$(PYTHON) -S %s %s\n' % (
+                cmd_str(
+                    path.absolute(command_server.__file__),
+                    command_server.socket_path(self.build.directory),
+                ),
+                run_command_args,
+            ))
+        else:
+            out.write('RUN_COMMAND=$(PYTHON) %s\n' % run_command_args)
+        out.write('MAKE_DEPENDS=$(PYTHON) %s --root %s --cache %s --makefile' % (
+            path.absolute(find_dependencies.__file__),
+            '.',
+            find_dependencies.CACHE_FILENAME,
+        ))
+        phony_rules = ['all', 'clean', 'FORCE']
+        out.write('\n.PHONY:\n.PHONY: %s\n' % ' '.join(phony_rules))
+        # Last hash of commands run, used to rebuild targets which command
+        # changed.
+        out.write('\n-include %s\n' % cmd_str(run_command.log_path(manifest)))
+
+    def write_depend_rule(self, out, target_sources, found_c_sources):
+        """Write the rule of the C/C++ header dependencies of all targets.
+
+        Targets, their sources and include directories are listed in a spec
+        file, scanned at once by a single find_dependencies.py process.
+        """
+        relative = lambda node: node.relative_path(self.build.directory)
+        spec = []
+        for target in sorted(target_sources, key = lambda n: n.path):
+            sources = sorted(target_sources[target], key = lambda n: n.path)
+            include_directories = []
+            system_include_directories = []
             for input in sources:
-                p = input.relative_path(self.build.directory)
-                makefile += (78 - prev) * ' ' + '\\\n\t  %s' %  p
-                prev = len(p) + 8 + 2
-                for dir in found_c_sources[input]:
-                    p = dir.relative_path(self.build.directory)
-                    makefile += (78 - prev) * ' ' + '\\\n\t  -I %s' %  p
-                    prev = len(p) + 8 + 2 + 3
-            makefile += '\n\n-include %s' % depend
-            #makefile += '\n%s: %s' % (target_path, depend)
+                directories, system_directories = found_c_sources[input]
+                include_directories.extend(map(relative, directories))
+                system_include_directories.extend(system_directories)
+            entry = {
+                'target': relative(target),
+                'sources': [relative(input) for input in sources],
+                'include_directories': tools.unique(include_directories),
+            }
+            if system_include_directories:
+                entry['system_include_directories'] = tools.unique(system_include_directories)
+            spec.append(entry)
+        self.write_file(
+            self.depend_spec,
+            json.dumps({'targets': spec}, indent = 0, sort_keys = True) + '\n'
+        )
+        depend = path.basename(self.depend_makefile)
+        depend_spec = path.basename(self.depend_spec)
+        out.write('\n%s:' % depend)
+        out.continuation(depend_spec)
+        for p in sorted(set(p for entry in spec for p in entry['sources'])):
+            out.continuation(p)
+        out.write('\n\t@$(MAKE_DEPENDS) -o %s --batch %s' % (depend, depend_spec))
+        out.write('\n\n-include %s\n' % depend)
 
-        #######################################################################
-        # Dump commands
-        for p, commands in self.commands.items():
-            outputs = tools.unique(
-                map(
-                    lambda n: n.relative_path(),
-                    sum((cmd.outputs for cmd in commands), ())
-                )
+    def write_command_rule(self, out, key, manifest, priorities):
+        """Write the rule of commands building the target `key`, returns
+        their command manifest entry.
+        """
+        commands = self.commands[key]
+        outputs = tools.unique(
+            map(
+                lambda n: n.relative_path(),
+                sum((cmd.outputs for cmd in commands), ())
             )
-            assert len(outputs)
-            makefile += '\n\n%s:' % outputs[0]
-            prev = len(p) + 1
-            commands = tools.unique(commands)
-            for cmd in commands:
-                #makefile += (79 - prev) * ' ' + '\\\n  %s' % cmd.relative_path
-                #prev = len(cmd.relative_path) + 2
-                for input in cmd.dependencies + cmd.target.dependencies:
-                    p = input.relative_path(self.build.directory)
-                    makefile += (78 - prev) * ' ' + '\\\n  %s' %  p
-                    prev = len(p) + 2
-            makefile += '\n\t@$(PYTHON) %s' % cmd_str(commands[0].relative_path(self.build.directory))
-            self.build.generate_commands(commands)
-
-            if len(outputs) > 1:
-                for o in outputs[1:]:
-                    makefile += "\n\n%s: %s" % (o, outputs[0])
-
-
-        makefile += '\n\n'
-        with open(self.makefile, 'w') as f:
-            f.write(makefile)
-
-        return
-
-        # XXX old stuff
-        cmd_count = 0
-        for depends_mode in (True, False):
-            for target_path, target_list in self.targets.items():
-                assert len(target_list) > 0
-                target = target_list[0][0]
-                target_str = str(target)
-                header_dependency = bool(target_str.endswith('.depends.mk'))
-                if (depends_mode and not header_dependency) or \
-                   (not depends_mode and header_dependency):
-                    continue
+        )
+        assert len(outputs)
+        commands = tools.unique(commands)
+        entry = self.build.command_manifest_entry(commands)
+        out.write('\n\n%s:' % outputs[0])
+        # Force the rule when the command changed since the last run
+        out.continuation('$(if $(filter %s,$(%s)),,FORCE)' % (
+            run_command.entry_hash(entry),
+            run_command.log_variable(key),
+        ))
+        inputs = tools.unique(path.relatives(
+            (
+                input.path
+                for cmd in commands
+                for input in cmd.dependencies + self.rule_dependencies(cmd.target)
+                if not isinstance(input, Command)
+            ),
+            self.build.directory
+        ))
+        for p in sorted(inputs, key = lambda p: -priorities.get(p, 0)):
+            out.continuation(p)
+        if all(self.is_native_command(cmd, self.build.directory) for cmd in commands):
+            for cmd, cmd_entry in zip(commands, entry):
+                out.write('\n\t@echo %s' % cmd_str(cmd_entry['action'], cmd_entry['target']))
+                out.write('\n\t%s' % cmd_str(*cmd_entry['command']).replace('$', '$$'))
+            out.write('\n\t@echo %s >> %s' % (
+                cmd_str(run_command.log_line(key, run_command.entry_hash(entry)).strip()),
+                cmd_str(run_command.log_path(manifest)),
+            ))
+        else:
+            out.write('\n\t@$(RUN_COMMAND) %s' % cmd_str(key))
 
-                inputs = sum((t[1] for t in target_list), [])
-                additional_inputs = sum((t[2] for t in target_list), [])
-                makefile += '# ------- %s:\n' % path.basename(target.path(self.build))
-                makefile += '%s:' % target.relpath(self.build.directory, self.build)
-                if self.build.dependencies:
-                    makefile += ' %s' % ' '.join(deps)
-                for i in inputs + additional_inputs:
-                    makefile += ' %s' % i.relpath(self.build.directory, self.build)
-
-                for idx, target_info in enumerate(target_list):
-                    _, _, _, action, command = target_info
-                    cmd_count += 1
-
-                    timer_path = \
-                            target.relpath(self.build.directory, self.build) + \
-                            '.timer.%s' % cmd_count
-                    makefile += '\n\t@%s' % cmd_str(
-                        'sh', '-c', 'python -c "import time; print(time.time())" > %s' %
-                        timer_path
-                    )
+        if len(outputs) > 1:
+            for o in outputs[1:]:
+                out.write("\n\n%s: %s" % (o, outputs[0]))
+        for cmd in commands:
+            if cmd.depfile is not None:
+                out.write('\n\n-include %s' % cmd_str(
+                    path.relative(cmd.depfile, start = self.build.directory)
+                ))
+        return entry
 
-                    # dump command
-                    makefile += '\n\t%s' % cmd_str(*command)
-
-                    # echo line
-                    makefile += '\n\t@echo `%s`' % (
-                         'python -c \'%s\'' % (
-                             'import time; print("' +
-                             '[%4f secs] ' +
-                             '\033[0;34m' + action + '\033[0m ' +
-                             '\033[0;31m' + target.relpath(self.project.directory, self.build) + '\033[0m' +
-                             '" % (time.time() - float(open("' +
-                             timer_path +
-                             '").read())))'
-                         )
-                    )
-                    makefile += '\n\t@%s' % cmd_str('rm', '-f', timer_path)
-                makefile += '\n\n'
+    def rule_dependencies(self, target):
+        """Returns the dependencies of a target written in its rule."""
+        if self.reduced_graph is None:
+            return target.dependencies
+        graph = self.reduced_graph
+        kept = set(graph.path(id) for id in graph.dependencies(graph.id(target.path)))
+        return [dep for dep in target.dependencies if dep.path in kept]
 
-                if target_str.endswith('.depends.mk'):
-                    makefile += 'include %s\n\n' % target_str
+    @property
+    def rules_directory(self):
+        return path.join(self.build.directory, '.rules')
 
-        with open(self.makefile, 'w') as f:
-            f.write(makefile)
+    @staticmethod
+    def fragment_name(directory):
+        """Name of the fragment of rules of targets in `directory`."""
+        return hashlib.sha1(directory.encode('utf8')).hexdigest()[:16] + '.mk'
 
@@ -0,0 +1,320 @@
+# -*- encoding: utf-8 -*-
+
+import multiprocessing
+import pipes
+import sys
+
+from .. import path
+from .. import tools
+
+from ..generator import Generator
+from ..target import Target
+from ..command import Command
+
+from .. import schedule
+
+from . import command_server
+from . import find_dependencies
+from . import run_command
+
+MAKEFILE_TEMPLATE = """
+.PHONY:
+.PHONY: all clean
+
+all:
+	@%(ninja_bin)s
+
+clean:
+	@%(ninja_bin)s -t clean
+"""
+
+def escape(s):
+    """Escape a string used in a ninja variable value."""
+    return s.replace('$', '$$')
+
+def escape_path(p):
+    """Escape a path used in a ninja build statement."""
+    return p.replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+class Ninja(Generator):
+    """Generate a build.ninja file.
+
+    Objects built from C/C++ sources get their header dependencies through
+    a depfile (`deps = gcc`), link commands share a pool (its depth is set by
+    the NINJA_LINK_POOL_DEPTH build variable) and all commands are declared
+    with `restat`, so that outputs left untouched do not trigger their
+    dependents. The build.ninja file is regenerated by ninja itself when the
+    project file changes.
+    """
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.ninja_file = path.join(self.build.directory, 'build.ninja')
+        self.command_runner = self.build.env.get(
+            'COMMAND_RUNNER',
+            command_server.is_available()
+        )
+        self.link_pool_depth = self.build.env.get(
+            'NINJA_LINK_POOL_DEPTH',
+            max(1, multiprocessing.cpu_count() // 4)
+        )
+
+    @property
+    def outputs(self):
+        return [
+            self.ninja_file,
+            path.join(self.build.directory, 'Makefile'),
+            self.build.command_manifest,
+        ]
+
+    def begin(self):
+        self.targets = {}
+        self.commands = {}
+
+    def __call__(self, node):
+        if isinstance(node, (Target, Command)) and node.build is not self.build:
+            # Built by the dependencies build (see the 'dependency' rule)
+            return False
+        if isinstance(node, Target):
+            if self.targets.get(node.path, node) is not node:
+                raise Exception(
+                    "Path %s is generated by two different node: %s and %s" % (
+                        node.path, self.targets[node.path], node
+                    )
+                )
+            self.targets[node.path] = node
+        elif isinstance(node, Command):
+            self.commands.setdefault(node.target.path, []).append(node)
+
+    def relative(self, node):
+        return escape_path(node.relative_path(self.build.directory))
+
+    def end(self):
+        from configure.lang.c.compiler import CSource
+        from configure.lang.cxx.compiler import CXXSource
+        from configure.compiler import IncludeDirectory, LibraryTarget, ExecutableTarget
+
+        cmd_str = lambda *cmd: ' '.join(map(pipes.quote, cmd))
+        manifest = path.relative(
+            self.build.command_manifest,
+            start = self.build.directory,
+        )
+        run_command_args = cmd_str(
+            path.absolute(run_command.__file__),
+            manifest,
+        )
+        if self.command_runner:
+            run_command_args = '-S %s %s' % (
+                cmd_str(
+                    path.absolute(command_server.__file__),
+                    command_server.socket_path(self.build.directory),
+                ),
+                run_command_args,
+            )
+
+        lines = [
+            '# Generated ninja file',
+            '',
+            'ninja_required_version = 1.3',
+            '',
+            'python = %s' % escape(pipes.quote(sys.executable)),
+            'run_command = $python %s' % escape(run_command_args),
+            'scan_dependencies = $python %s --root . --cache %s --makefile' % (
+                escape(pipes.quote(path.absolute(find_dependencies.__file__))),
+                find_dependencies.CACHE_FILENAME,
+            ),
+            '',
+            'pool link_pool',
+            '  depth = %s' % self.link_pool_depth,
+            '',
+            'rule command',
+            '  command = $run_command $key $hash',
+            '  description = $action $out',
+            '  restat = 1',
+            '',
+            'rule link',
+            '  command = $run_command $key $hash',
+            '  description = $action $out',
+            '  pool = link_pool',
+            '  restat = 1',
+            '',
+            'rule compile',
+            '  command = $run_command $key $hash && $scan_dependencies -o $out.d -t $out $scan_args',
+            '  description = $action $out',
+            '  depfile = $out.d',
+            '  deps = gcc',
+            '  restat = 1',
+            '',
+            'rule native',
+            '  command = $cmd',
+            '  description = $action $out',
+            '  restat = 1',
+            '',
+            # Header dependencies written by the compiler
+            'rule compile_depfile',
+            '  command = $run_command $key $hash',
+            '  description = $action $out',
+            '  depfile = $depfile',
+            '  deps = gcc',
+            '  restat = 1',
+            '',
+            'rule native_compile_depfile',
+            '  command = $cmd',
+            '  description = $action $out',
+            '  depfile = $depfile',
+            '  deps = gcc',
+            '  restat = 1',
+            '',
+            'rule native_compile',
+            '  command = $cmd && $scan_dependencies -o $out.d -t $out $scan_args',
+            '  description = $action $out',
+            '  depfile = $out.d',
+            '  deps = gcc',
+            '  restat = 1',
+            '',
+            'rule dependency',
+            '  command = %s -C %s $target' % (
+                escape(pipes.quote(self.build.make_program)),
+                escape(pipes.quote(path.relative(
+                    self.build.dependencies_directory,
+                    start = self.build.directory,
+                ))),
+            ),
+            '  description = Build dependency $out',
+            '  restat = 1',
+        ]
+
+        #######################################################################
+        # Regenerate build.ninja when the project changes
+        if tools.CONFIGURE_SCRIPT is not None:
+            lines.extend([
+                '',
+                'rule configure',
+                # build.ninja is only rewritten when its content changed:
+                # touch it so that ninja does not regenerate it again.
+                '  command = cd %s && $python %s && touch %s' % (
+                    escape(pipes.quote(self.project.directory)),
+                    escape(cmd_str(tools.CONFIGURE_SCRIPT, self.build.directory)),
+                    escape(pipes.quote(self.ninja_file)),
+                ),
+                '  description = Configuring build directory',
+                '  generator = 1',
+                '',
+                'build build.ninja: configure %s' % escape_path(
+                    path.relative(
+                        self.project.config_file,
+                        start = self.build.directory,
+                    )
+                ),
+                '  pool = console',
+            ])
+
+        #######################################################################
+        # Dependencies
+        for dep in self.build.dependencies:
+            for target in dep.targets:
+                lines.extend([
+                    '',
+                    'build %s: dependency' % self.relative(target),
+                    '  target = %s' % escape(pipes.quote(
+                        path.relative(target.path, start = self.build.dependencies_directory)
+                    )),
+                ])
+
+        #######################################################################
+        # Commands
+        manifest_entries = {}
+        commands_by_key = dict(
+            (commands[0].target.relative_path(self.build.directory), tools.unique(commands))
+            for commands in self.commands.values()
+        )
+        # Longest command chains first
+        priorities = schedule.command_priorities(self.build, commands_by_key)
+        by_priority = lambda key: (-priorities.get(key, 0), key)
+        for key in sorted(commands_by_key, key = by_priority):
+            commands = commands_by_key[key]
+            target = commands[0].target
+            entry = self.build.command_manifest_entry(commands)
+            manifest_entries[key] = entry
+
+            outputs = tools.unique(
+                self.relative(o) for o in sum((cmd.outputs for cmd in commands), ())
+            )
+            inputs = tools.unique(
+                self.relative(input)
+                for cmd in commands
+                for input in cmd.dependencies + cmd.target.dependencies
+                if not isinstance(input, Command)
+            )
+
+            # Ninja reads one depfile per build statement, sources are scanned
+            # otherwise.
+            depfiles = [cmd.depfile for cmd in commands if cmd.depfile is not None]
+            depfile = len(depfiles) == 1 and depfiles[0] or None
+            scan_args = []
+            for cmd in commands:
+                if depfile is not None:
+                    break
+                for input in cmd.target.dependencies:
+                    if isinstance(input, (CSource, CXXSource)):
+                        scan_args.append(input.relative_path(self.build.directory))
+                        for dir in cmd.find_instances(IncludeDirectory):
+                            scan_args.extend(['-I', dir.relative_path(self.build.directory)])
+                        for dir in cmd.system_include_directories:
+                            scan_args.extend(['--system-include-directory', dir])
+            native = all(
+                self.is_native_command(cmd, self.build.directory)
+                for cmd in commands
+            )
+            if depfile is not None:
+                rule = native and 'native_compile_depfile' or 'compile_depfile'
+            elif scan_args:
+                rule = native and 'native_compile' or 'compile'
+            elif native:
+                rule = 'native'
+            elif isinstance(target, (LibraryTarget, ExecutableTarget)):
+                rule = 'link'
+            else:
+                rule = 'command'
+
+            lines.append('')
+            lines.append('build %s: %s %s' % (' '.join(outputs), rule, ' '.join(inputs)))
+            lines.append('  action = %s' % escape(commands[0].action))
+            if native:
+                lines.append('  cmd = %s' % escape(' && '.join(
+                    cmd_str(*e['command']) for e in entry
+                )))
+                if isinstance(target, (LibraryTarget, ExecutableTarget)):
+                    lines.append('  pool = link_pool')
+            else:
+                lines.append('  key = %s' % escape(pipes.quote(key)))
+                lines.append('  hash = %s' % run_command.entry_hash(entry))
+            if scan_args:
+                lines.append('  scan_args = %s' % escape(cmd_str(*scan_args)))
+            if depfile is not None:
+                lines.append('  depfile = %s' % escape(
+                    path.relative(depfile, start = self.build.directory)
+                ))
+
+        self.build.generate_command_manifest(manifest_entries)
+
+        lines.append('')
+        lines.append('build all: phony %s' % ' '.join(
+            escape_path(p) for p in sorted(
+                (t.relative_path(self.build.directory) for t in self.targets.values()),
+                key = by_priority
+            )
+        ))
+        lines.append('')
+        lines.append('default all')
+        lines.append('')
+        self.write_file(self.ninja_file, '\n'.join(lines))
+
+        self.generate_makefile()
+
+    def generate_makefile(self):
+        ninja_bin = tools.which('ninja') or 'ninja'
+        self.write_file(
+            path.join(self.build.directory, 'Makefile'),
+            MAKEFILE_TEMPLATE % {'ninja_bin': pipes.quote(ninja_bin)}
+        )
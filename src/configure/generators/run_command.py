@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- encoding: utf8 -*-
+
+"""Run the commands of a target from the build command manifest.
+
+    python run_command.py MANIFEST KEY [HASH]
+
+The manifest is a text file written at configure time, with one line per
+target, sorted by key:
+
+    KEY <tab> HASH <tab> JSON ENTRY
+
+It starts with a header line holding values shared by all entries. Entries
+are found with a binary search, so that only a few lines are read whatever
+the size of the build.
+
+When all commands of a target succeed, the command hash is appended to the
+command log (MANIFEST + '.mk'), a makefile included by generated Makefiles
+to rebuild targets whose command changed.
+
+The duration of successful commands is appended to the duration log
+(MANIFEST + '.durations'), used to schedule long command chains first. When
+tracing is enabled in the manifest header, every command run is also
+appended to the trace log (MANIFEST + '.trace'), see configure/trace.py.
+
+When HASH is given, the build system tracks command changes by itself (the
+hash is part of its command line): the command log is not written, and the
+script fails if the manifest entry does not match HASH.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+HEADER = b'#configure.py commands'
+
+def log_path(manifest):
+    """Path of the command log associated to a manifest."""
+    return manifest + '.mk'
+
+def log_variable(key):
+    """Make variable name storing the last command hash of a key."""
+    return 'COMMAND_HASH.' + ''.join(
+        (c.isalnum() or c in '._-+/') and c or '_' for c in key
+    )
+
+def log_line(key, hash):
+    return '%s := %s\n' % (log_variable(key), hash)
+
+def duration_log_path(manifest):
+    """Path of the duration log associated to a manifest."""
+    return manifest + '.durations'
+
+def duration_line(key, seconds):
+    return '%s\t%.3f\n' % (key, seconds)
+
+def trace_log_path(manifest):
+    """Path of the trace log associated to a manifest."""
+    return manifest + '.trace'
+
+def trace_line(start, end, pid, action, target, status):
+    return dumps({
+        'start': start,
+        'end': end,
+        'pid': pid,
+        'action': action,
+        'target': target,
+        'status': status,
+    }) + '\n'
+
+def append_line(path, line):
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode('utf8'))
+    finally:
+        os.close(fd)
+
+def entry_hash(entry):
+    import hashlib
+    return hashlib.sha1(dumps(entry).encode('utf8')).hexdigest()
+
+def dumps(obj):
+    return json.dumps(obj, sort_keys = True, separators = (',', ':'))
+
+def manifest_content(header, entries):
+    """Returns the manifest content (bytes) for a header and a dict of
+    entries.
+    """
+    lines = [HEADER + b'\t' + dumps(header).encode('utf8') + b'\n']
+    for key, entry in sorted(entries.items(), key = lambda e: e[0].encode('utf8')):
+        assert '\t' not in key and '\n' not in key
+        lines.append(
+            ('%s\t%s\t%s\n' % (key, entry_hash(entry), dumps(entry))).encode('utf8')
+        )
+    return b''.join(lines)
+
+def _find_line(f, key, start, end):
+    """Binary search of the line starting with `key` in [start, end)."""
+    while start < end:
+        mid = (start + end) // 2
+        f.seek(mid)
+        if mid > start:
+            f.readline()
+        pos = f.tell()
+        if pos >= end:
+            break
+        line = f.readline()
+        k = line.split(b'\t', 1)[0]
+        if k == key:
+            return line
+        elif k < key:
+            start = f.tell()
+        else:
+            end = pos
+    f.seek(start)
+    while f.tell() < end:
+        line = f.readline()
+        if line.split(b'\t', 1)[0] == key:
+            return line
+    return None
+
+def lookup(manifest, key):
+    """Returns the header, the hash and the entry of `key`, or None."""
+    with open(manifest, 'rb') as f:
+        header = f.readline()
+        if not header.startswith(HEADER + b'\t'):
+            raise Exception("'%s' is not a command manifest" % manifest)
+        f.seek(0, os.SEEK_END)
+        line = _find_line(f, key.encode('utf8'), len(header), f.tell())
+    if line is None:
+        return None
+    _, hash, entry = line.decode('utf8').split('\t', 2)
+    return json.loads(header[len(HEADER) + 1:].decode('utf8')), hash, json.loads(entry)
+
+def run(manifest, key, expected_hash = None):
+    res = lookup(manifest, key)
+    if res is None:
+        print("No command found for '%s' in %s" % (key, manifest), file = sys.stderr)
+        return 1
+    header, hash, entry = res
+    start = time.time()
+    if expected_hash is not None and expected_hash != hash:
+        print(
+            "The command of '%s' in %s is out of date, please reconfigure" % (key, manifest),
+            file = sys.stderr
+        )
+        return 1
+    for cmd in entry:
+        env = {}
+        env.update(header['os_env'])
+        env.update(cmd['env'])
+        print(cmd['action'], cmd['target'])
+        print(*cmd['command'])
+        sys.stdout.flush()
+        cmd_start = time.time()
+        p = subprocess.Popen(cmd['command'], cwd = cmd['cwd'], env = env)
+        status = p.wait()
+        if header.get('trace'):
+            append_line(
+                trace_log_path(manifest),
+                trace_line(cmd_start, time.time(), p.pid, cmd['action'], cmd['target'], status)
+            )
+        if status != 0:
+            return status
+    append_line(duration_log_path(manifest), duration_line(key, time.time() - start))
+    if expected_hash is None:
+        append_line(log_path(manifest), log_line(key, hash))
+    return 0
+
+def main(argv):
+    if len(argv) not in (3, 4):
+        print("usage: %s MANIFEST KEY [HASH]" % argv[0], file = sys.stderr)
+        return 2
+    return run(*argv[1:])
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -48,12 +48,8 @@ class Tup(Generator):
         self.targets = {}
         self.directories = {}
         self.commands = {}
-        self.seen = set()
 
     def __call__(self, node):
-        if node in self.seen:
-            return False
-        self.seen.add(node)
         if isinstance(node, Target):
             if node.path not in self.targets:
                 self.targets[node.path] = node
@@ -69,9 +65,9 @@ class Tup(Generator):
         for dir, targets in self.directories.items():
             tupfile = path.join(dir, 'Tupfile')
             tupfiles.add(tupfile)
-            with open(tupfile, 'w') as tupfile:
+            with self.open(tupfile) as out:
                 for target in targets:
-                    self.write_rule(dir, tupfile, target)
+                    self.write_rule(dir, out, target)
         for tupfile in tools.find_files(
             name = 'Tupfile',
             working_directory = self.build.directory):
@@ -90,20 +86,36 @@ class Tup(Generator):
         if command is None:
             return
 
+        native = self.is_native_command(command, dir)
+        if native:
+            shell = ' '.join(map(pipes.quote, command.relative_command(dir)))
+            # '%' introduces tup flags
+            native = '%' not in shell
+
         tools.debug("Add Tup rule for %s" % target)
         write(":")
-        for input in command.target.dependencies:
-            if input.path.startswith(self.project.directory):
-                write('\t', input.relative_path(dir))
+        inputs = (
+            input.path for input in command.target.dependencies
+            if not (native and isinstance(input, Command)) and
+            input.path.startswith(self.project.directory)
+        )
+        for input in path.relatives(inputs, dir):
+            write('\t', input)
 
         write("|> ^o", command.action, target.basename, "^")
-        write("%s -B %s" % (sys.executable, command.basename))
-        write("|>", ' '.join(
-            output.relative_path(dir)
-            for output in command.outputs
-        ))
+        if native:
+            write(shell)
+        else:
+            write("%s -B %s" % (sys.executable, command.basename))
+        outputs = [output.path for output in command.outputs]
+        if command.depfile is not None:
+            # Tup tracks headers itself, but every file written by a command
+            # must be declared
+            outputs.append(command.depfile)
+        write("|>", ' '.join(path.relatives(outputs, dir)))
         tupfile.write('\n')
-        self.build.generate_commands([command], from_target = True)
+        if not native:
+            self.build.generate_commands([command], from_target = True)
 
 
     def generate_makefile(self):
@@ -135,9 +147,10 @@ class Tup(Generator):
                 path.relative(dep, start = deps_dir)
             )
 
-        makefile = path.join(self.build.directory, 'Makefile')
-        with open(makefile, 'w') as f:
-            f.write(makefile_content)
+        self.write_file(
+            path.join(self.build.directory, 'Makefile'),
+            makefile_content
+        )
 
         if not path.exists(path.join(self.project.directory, '.tup')):
             cmd = ['make', '-C', self.build.directory]
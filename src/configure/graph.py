@@ -0,0 +1,307 @@
+# -*- encoding: utf-8 -*-
+
+"""Compact build graph.
+
+A `Graph` stores nodes as integer ids: paths are interned in a string table,
+node kinds (class names) in another one, and edges are kept in flat arrays
+(compressed sparse rows) once the graph is frozen. It is a snapshot of the
+node graph of a build (see `Build.graph()`), for consumers that only need its
+structure on large builds.
+"""
+
+from array import array
+
+class GraphNode:
+    """Lightweight view of a graph node."""
+
+    __slots__ = ('graph', 'id')
+
+    def __init__(self, graph, id):
+        self.graph = graph
+        self.id = id
+
+    @property
+    def path(self):
+        return self.graph.path(self.id)
+
+    @property
+    def kind(self):
+        return self.graph.kind(self.id)
+
+    @property
+    def dependencies(self):
+        return [GraphNode(self.graph, id) for id in self.graph.dependencies(self.id)]
+
+    @property
+    def dependents(self):
+        return [GraphNode(self.graph, id) for id in self.graph.dependents(self.id)]
+
+    def __eq__(self, other):
+        return isinstance(other, GraphNode) and \
+            self.graph is other.graph and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return "<%s %s>" % (self.kind, self.path)
+
+class Graph:
+
+    def __init__(self):
+        self.__strings = []
+        self.__string_ids = {}
+        self.__kinds = []
+        self.__kind_ids = {}
+        self.__node_paths = array('l')
+        self.__node_kinds = array('h')
+        self.__node_ids = {}
+        # Edges as (source, destination) pairs until frozen
+        self.__edges = array('l')
+        self.__offsets = None
+        self.__targets = None
+        self.__reverse = None
+
+    @property
+    def frozen(self):
+        return self.__offsets is not None
+
+    def __len__(self):
+        return len(self.__node_paths)
+
+    def intern(self, string):
+        """Returns the id of a string in the string table."""
+        id = self.__string_ids.get(string)
+        if id is None:
+            id = self.__string_ids[string] = len(self.__strings)
+            self.__strings.append(string)
+        return id
+
+    def add_node(self, path, kind):
+        """Add a node, returns its id. Paths identify nodes: adding twice
+        the same path returns the same id.
+        """
+        path_id = self.intern(path)
+        id = self.__node_ids.get(path_id)
+        if id is not None:
+            return id
+        assert not self.frozen
+        kind_id = self.__kind_ids.get(kind)
+        if kind_id is None:
+            kind_id = self.__kind_ids[kind] = len(self.__kinds)
+            self.__kinds.append(kind)
+        id = self.__node_ids[path_id] = len(self.__node_paths)
+        self.__node_paths.append(path_id)
+        self.__node_kinds.append(kind_id)
+        return id
+
+    def add_edge(self, node, dependency):
+        """`node` depends on `dependency` (both are ids)."""
+        assert not self.frozen
+        self.__edges.extend((node, dependency))
+
+    def freeze(self):
+        """Convert edges to compressed sparse rows. No node or edge can be
+        added afterwards.
+        """
+        if self.frozen:
+            return self
+        self.__offsets, self.__targets = self.__csr(self.__edges, 0)
+        self.__edges = None
+        return self
+
+    def __csr(self, edges, source):
+        """Returns (offsets, targets) arrays of edges grouped by their
+        `source` index (0 for dependencies, 1 for dependents).
+        """
+        count = len(self.__node_paths)
+        offsets = array('l', [0]) * (count + 1)
+        for i in range(source, len(edges), 2):
+            offsets[edges[i] + 1] += 1
+        for i in range(count):
+            offsets[i + 1] += offsets[i]
+        position = array('l', offsets)
+        targets = array('l', [0]) * (len(edges) // 2)
+        for i in range(0, len(edges), 2):
+            src, dst = edges[i + source], edges[i + 1 - source]
+            targets[position[src]] = dst
+            position[src] += 1
+        return offsets, targets
+
+    def id(self, path):
+        """Returns the id of the node at `path`, or None."""
+        path_id = self.__string_ids.get(path)
+        if path_id is None:
+            return None
+        return self.__node_ids.get(path_id)
+
+    def node(self, path):
+        id = self.id(path)
+        return id is not None and GraphNode(self, id) or None
+
+    def path(self, id):
+        return self.__strings[self.__node_paths[id]]
+
+    def kind(self, id):
+        return self.__kinds[self.__node_kinds[id]]
+
+    def dependencies(self, id):
+        """Returns the ids of the dependencies of a node."""
+        assert self.frozen
+        return self.__targets[self.__offsets[id]:self.__offsets[id + 1]]
+
+    def dependents(self, id):
+        """Returns the ids of nodes depending on a node."""
+        assert self.frozen
+        if self.__reverse is None:
+            edges = array('l')
+            for id_ in range(len(self)):
+                for dep in self.dependencies(id_):
+                    edges.extend((id_, dep))
+            self.__reverse = self.__csr(edges, 1)
+        offsets, targets = self.__reverse
+        return targets[offsets[id]:offsets[id + 1]]
+
+    def nodes(self):
+        return (GraphNode(self, id) for id in range(len(self)))
+
+    def transitive_reduction(self):
+        """Returns a frozen copy of the graph without redundant edges: an
+        edge from a node to one of its dependencies is redundant when the
+        dependency is also reachable through another dependency.
+
+        Nodes are expected dependencies first (see `from_nodes()`): a node
+        only reaches nodes added before it, so the search from the
+        dependencies of a node is bounded by its oldest dependency, and
+        dependencies are searched newest first so that each reachable node
+        is visited once per node. Edges to nodes added later (dependency
+        cycles) are kept and not followed.
+        """
+        assert self.frozen
+        graph = Graph()
+        for id in range(len(self)):
+            graph.add_node(self.path(id), self.kind(id))
+        # Last node whose dependencies reached each node
+        reached = array('l', [-1]) * len(self)
+        edges = array('l')
+        dependencies_of = self.dependencies
+        for id in range(len(self)):
+            dependencies = dependencies_of(id)
+            older = sorted(set(dep for dep in dependencies if dep < id), reverse = True)
+            if len(older) > 1:
+                bound = older[-1]
+                for dep in older:
+                    if reached[dep] == id:
+                        continue
+                    stack = [d for d in dependencies_of(dep) if bound <= d < dep]
+                    while stack:
+                        node = stack.pop()
+                        if reached[node] != id:
+                            reached[node] = id
+                            stack.extend(
+                                d for d in dependencies_of(node) if bound <= d < node
+                            )
+            for dep in dependencies:
+                if dep >= id or reached[dep] != id:
+                    edges.append(id)
+                    edges.append(dep)
+        graph.__edges.extend(edges)
+        return graph.freeze()
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """Build a frozen graph of nodes (dependencies first, see
+        `node.walk()`).
+        """
+        graph = cls()
+        ids = {}
+        for node in nodes:
+            ids[node] = graph.add_node(node.path, node.__class__.__name__)
+        edges = []
+        for node, id in ids.items():
+            for dep in node.dependencies:
+                edges.append(id)
+                edges.append(ids[dep])
+        graph.__edges.extend(edges)
+        return graph.freeze()
+
+
+from unittest import TestCase
+
+class _(TestCase):
+
+    def test_graph(self):
+        g = Graph()
+        a = g.add_node('/a', 'Source')
+        b = g.add_node('/b', 'Source')
+        c = g.add_node('/c', 'Target')
+        self.assertEqual(g.add_node('/a', 'Source'), a)
+        g.add_edge(c, a)
+        g.add_edge(c, b)
+        g.add_edge(b, a)
+        g.freeze()
+        self.assertEqual(list(g.dependencies(c)), [a, b])
+        self.assertEqual(list(g.dependencies(b)), [a])
+        self.assertEqual(list(g.dependencies(a)), [])
+        self.assertEqual(sorted(g.dependents(a)), [b, c])
+        self.assertEqual(list(g.dependents(c)), [])
+        self.assertEqual(g.node('/c').dependencies[1].path, '/b')
+        self.assertEqual(g.node('/b').kind, 'Source')
+        self.assertIsNone(g.id('/d'))
+
+    def test_transitive_reduction(self):
+        g = Graph()
+        # exe -> (a.o, lib, b.o), lib -> a.o, a.o -> a.c, b.o -> b.c
+        a_c, b_c = g.add_node('/a.c', 'Source'), g.add_node('/b.c', 'Source')
+        a_o, b_o = g.add_node('/a.o', 'Target'), g.add_node('/b.o', 'Target')
+        lib = g.add_node('/lib', 'Target')
+        exe = g.add_node('/exe', 'Target')
+        for node, dep in [(a_o, a_c), (b_o, b_c), (lib, a_o), (exe, a_o),
+                          (exe, lib), (exe, b_o), (exe, a_c)]:
+            g.add_edge(node, dep)
+        r = g.freeze().transitive_reduction()
+        self.assertEqual(list(r.dependencies(exe)), [lib, b_o])
+        self.assertEqual(list(r.dependencies(lib)), [a_o])
+        self.assertEqual(list(r.dependencies(a_o)), [a_c])
+        self.assertEqual(r.path(exe), '/exe')
+
+    def test_transitive_reduction_cycle(self):
+        g = Graph()
+        a, b, c = g.add_node('/a', 'T'), g.add_node('/b', 'T'), g.add_node('/c', 'T')
+        # a -> c (added later), b -> a, b -> c, c -> b
+        for node, dep in [(a, c), (b, a), (b, c), (c, b)]:
+            g.add_edge(node, dep)
+        r = g.freeze().transitive_reduction()
+        self.assertEqual(list(r.dependencies(b)), [a, c])
+        self.assertEqual(list(r.dependencies(c)), [b])
+        self.assertEqual(list(r.dependencies(a)), [c])
+
+    def test_transitive_reduction_random(self):
+        import random
+        rand = random.Random(42)
+        g = Graph()
+        count = 60
+        for id in range(count):
+            g.add_node('/%s' % id, 'T')
+        edges = set()
+        for id in range(1, count):
+            for dep in rand.sample(range(id), min(id, 4)):
+                g.add_edge(id, dep)
+                edges.add((id, dep))
+        g.freeze()
+        def reachable(id, skip):
+            seen, stack = set(), [d for d in g.dependencies(id) if d != skip]
+            while stack:
+                n = stack.pop()
+                if n not in seen:
+                    seen.add(n)
+                    stack.extend(g.dependencies(n))
+            return seen
+        expected = set(
+            (id, dep) for id, dep in edges if dep not in reachable(id, dep)
+        )
+        r = g.transitive_reduction()
+        self.assertEqual(
+            set((id, dep) for id in range(count) for dep in r.dependencies(id)),
+            expected
+        )
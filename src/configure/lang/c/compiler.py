@@ -7,7 +7,7 @@ from . import library
 import configure.compiler
 
 class CSource(Source):
-    pass
+    __slots__ = ()
 
 class Compiler(configure.compiler.Compiler):
     binary_env_varname = 'CC'
@@ -2,12 +2,14 @@
 
 import sys
 import pipes
+import subprocess
 
-from configure import Target, path, tools, platform
+from configure import Target, path, tools, platform, toolchain
 from configure.command import Command
 
 from . import compiler as c_compiler
 from . import library
+from . import object_cache
 
 class Compiler(c_compiler.Compiler):
 
@@ -108,6 +110,9 @@ class Compiler(c_compiler.Compiler):
         return flags
 
     def _build_object_cmd(self, object, source, **kw):
+        depfile = None
+        system_include_directories = ()
+        system_headers = self.build.env.get('SYSTEM_HEADER_DEPENDENCIES', False)
         if source.path.endswith('.S'):
             command = [
                 self.as_binary,
@@ -115,21 +120,122 @@ class Compiler(c_compiler.Compiler):
                 source,
             ],
         else:
+            depfile = self._depfile(object)
+            flags = [self.__architecture_flag(kw)] + self._get_build_flags(kw)
             command = [
                 self.binary,
-                self.__architecture_flag(kw),
-                self._get_build_flags(kw),
+                flags,
                 '-c', source,
                 '-o', object,
             ],
+            if depfile is not None:
+                command += ([system_headers and '-MD' or '-MMD', '-MP', '-MF', depfile],)
+            elif system_headers:
+                system_include_directories = self.system_include_directories(flags)
+            command = self._object_cache_wrapper() + list(command)
 
         return Command(
             action = kw.get('action', "Build object"),
             command = command,
             target = object,
             inputs = [source],
+            depfile = depfile,
+            system_include_directories = system_include_directories,
+        )
+
+    def _depfile(self, object):
+        """Returns the header dependencies file written when compiling
+        `object` (relative to the build directory), or None when headers are
+        found by scanning sources.
+
+        Compilers write them unless the HEADER_DEPENDENCIES build variable is
+        set to 'scan'. Cached objects are restored without running the
+        compiler: sources are always scanned with the object cache.
+        """
+        mode = self.build.env.get('HEADER_DEPENDENCIES', 'depfile')
+        if mode not in ('depfile', 'scan'):
+            raise Exception(
+                "HEADER_DEPENDENCIES must be 'depfile' or 'scan' (got '%s')" % mode
+            )
+        if mode != 'depfile' or self._object_cache_wrapper():
+            return None
+        return object.relative_path(self.build.directory) + '.d'
+
+    # Flags changing the system include directories (with their argument
+    # when it is a separate one).
+    __system_include_flags = {
+        '--sysroot': 1, '-isysroot': 1, '-isystem': 1, '-idirafter': 1,
+        '-target': 1, '-nostdinc': 0, '-nostdinc++': 0,
+    }
+    __system_include_flag_prefixes = (
+        '--sysroot=', '--target=', '-isystem', '-stdlib=', '-m32', '-m64', '-mx32',
+    )
+
+    def system_include_directories(self, flags = ()):
+        """Returns the directories searched for `#include <...>` after the
+        include directories, probed once per compiler binary and flags
+        changing them (see toolchain.py).
+        """
+        probe_flags = []
+        it = iter(f for f in flags if isinstance(f, str))
+        for flag in it:
+            if flag in self.__system_include_flags:
+                probe_flags.append(flag)
+                if self.__system_include_flags[flag]:
+                    probe_flags.append(next(it, ''))
+            elif flag.startswith(self.__system_include_flag_prefixes):
+                probe_flags.append(flag)
+
+        def probe():
+            output = subprocess.run(
+                [self.binary] + probe_flags + ['-x', self.lang, '-E', '-v', '-'],
+                stdin = subprocess.DEVNULL,
+                stdout = subprocess.DEVNULL,
+                stderr = subprocess.PIPE,
+            ).stderr.decode('utf8', 'replace')
+            res = []
+            searching = False
+            for line in output.splitlines():
+                if line.startswith('#include <...> search starts here:'):
+                    searching = True
+                elif line.startswith('End of search list.'):
+                    break
+                elif searching:
+                    dir = line.strip().split(' (')[0]
+                    if path.is_absolute(dir) and path.exists(dir):
+                        res.append(path.clean(dir))
+            return res
+        return toolchain.probe(
+            self.project,
+            self.binary,
+            ' '.join(['system_include_directories:%s' % self.lang] + probe_flags),
+            probe
         )
 
+    def _object_cache_wrapper(self, output = None):
+        """Returns the command prefix running a command through the object
+        cache, if enabled with the OBJECT_CACHE or OBJECT_CACHE_REMOTE build
+        variables (see object_cache.py).
+        """
+        remote = self.build.env.get('OBJECT_CACHE_REMOTE', None)
+        if not (self.build.env.get('OBJECT_CACHE', False) or remote):
+            return []
+        cache_dir = self.build.env.get(
+            'OBJECT_CACHE_DIR',
+            path.join(self.project.config_directory, 'object-cache')
+        )
+        wrapper = [
+            sys.executable,
+            path.join(path.dirname(__file__), 'object_cache.py'),
+            '--max-size', str(self.build.env.get('OBJECT_CACHE_SIZE', object_cache.MAX_SIZE)),
+        ]
+        if output is not None:
+            wrapper.extend(['--output', output])
+        if remote:
+            wrapper.extend(['--remote', remote])
+        wrapper.extend([cache_dir, '--'])
+        return wrapper
+
     def _build_object_dependencies_cmd(self, target, object, source, **kw):
         return Command(
             action = "Build dependencies makefile",
@@ -247,7 +353,7 @@ class Compiler(c_compiler.Compiler):
     def _link_executable_cmd(self, target, objects, **kw):
         return Command(
             action = "Link executable",
-            command = [
+            command = self._object_cache_wrapper(output = target) + [
                 self.binary,
                 objects,
                 self.__architecture_flag(kw),
@@ -288,8 +394,10 @@ class Compiler(c_compiler.Compiler):
                 )
                 shell.append(implib)
                 additional_outputs.append(implib)
+            else:
+                shell = self._object_cache_wrapper(output = target) + shell
         else:
-            shell = [
+            shell = self._object_cache_wrapper(output = target) + [
                 self.ar_binary,
                 'rcs',
                 target,
@@ -3,6 +3,7 @@
 from configure import tools
 from configure import path
 from configure import platform
+from configure import profiler
 
 import os
 
@@ -65,16 +66,17 @@ class Library:
             return
 
         tools.debug(self.name, "library prefixes:", self.prefixes)
-        self.include_directories = self._find_include_directories(include_directories)
-        tools.debug(self.name, "library include directories:", self.include_directories)
-        if search_binary_files:
-            self._set_directories_and_files(directories)
-        elif self.compiler.name == 'msvc' and self.system:
-            self.files = [self.name + '.lib'] # + self.compiler.library_extension(self.shared)]
-            self.directories = []
-        else:
-            self.files = self._env_files() + files
-            self.directories = self._env_directories() + directories
+        with profiler.phase('library %s' % self.name):
+            self.include_directories = self._find_include_directories(include_directories)
+            tools.debug(self.name, "library include directories:", self.include_directories)
+            if search_binary_files:
+                self._set_directories_and_files(directories)
+            elif self.compiler.name == 'msvc' and self.system:
+                self.files = [self.name + '.lib'] # + self.compiler.library_extension(self.shared)]
+                self.directories = []
+            else:
+                self.files = self._env_files() + files
+                self.directories = self._env_directories() + directories
 
         if link_files is None:
             if self.compiler.name == 'msvc':
@@ -169,7 +171,12 @@ class Library:
         if self.macosx_framework:
             dirs = (path.join(dir_, self.name + '.framework', 'lib') for dir_ in dirs)
 
-        dirs = list(path.clean(d) for d in tools.unique(dirs) if path.exists(d))
+        dirs = list(path.clean(d) for d in tools.unique(dirs))
+        for d in dirs:
+            if not path.exists(d):
+                # Searched again when created
+                tools.record_input(d)
+        dirs = list(d for d in dirs if path.exists(d))
 
         if self.binary_file_names is not None:
             names = self.binary_file_names
@@ -263,6 +270,8 @@ class Library:
             return tools.unique(self._env_include_directories() + include_directories)
         all_found = True
         for include in self.find_includes:
+            for dir_ in env_dirs:
+                tools.record_input(path.join(dir_, include))
             all_found = any(
                 path.exists(dir_, include) for dir_ in env_dirs
             )
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- encoding: utf8 -*-
+
+"""Build objects and linked files through a content addressed cache.
+
+    python object_cache.py [OPTIONS] CACHE_DIR -- COMMAND...
+    python object_cache.py --stats CACHE_DIR
+    python object_cache.py --clear CACHE_DIR
+
+By default, `COMMAND` must compile one source with `-c` and name the object
+with `-o`. The cache key is made of:
+
+    * The compiler binary (path, size and modification time)
+    * The compiler arguments, except the object name
+    * The preprocessed source (the same command with `-E`)
+    * The working directory, when debug information is generated (paths are
+      embedded in objects)
+
+With `--output FILE`, `COMMAND` is any command producing FILE (a link
+command): the key is made of the binary, the linker it runs, the arguments
+and the content of every argument (or `-Wl,` argument) naming an existing
+file. Libraries given with `-l` are resolved through the `-L` directories and
+the default search directories of the compiler: links using a library that
+cannot be found are not cached.
+
+On a hit, the file (and the command diagnostics) is copied from the cache.
+On a miss, the command is run and its output stored. Least recently used
+entries are removed when the cache grows beyond its maximum size.
+
+With `--remote URL`, local misses are looked up on a remote cache before
+running the command, and new entries are uploaded to it. The remote protocol
+is plain HTTP: `GET URL/KEY` returns an entry (or 404), `PUT URL/KEY` stores
+one. See configure/cache_server.py for a reference server.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+# Default maximum size of the cache in megabytes.
+MAX_SIZE = 1024
+
+# Bump this to invalidate all existing entries.
+VERSION = 1
+
+def _lock(cache_dir):
+    """Returns an exclusively locked file, or None when not supported."""
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    f = open(os.path.join(cache_dir, 'lock'), 'a')
+    fcntl.flock(f, fcntl.LOCK_EX)
+    return f
+
+def _stats_path(cache_dir):
+    return os.path.join(cache_dir, 'stats.json')
+
+def read_stats(cache_dir):
+    """Returns the cache statistics (hits, remote hits, misses, size in
+    bytes).
+    """
+    try:
+        with open(_stats_path(cache_dir)) as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        stats = {}
+    for k in ('hits', 'remote_hits', 'misses', 'size'):
+        stats.setdefault(k, 0)
+    return stats
+
+def _update_stats(cache_dir, max_size = None, **increments):
+    lock = _lock(cache_dir)
+    try:
+        stats = read_stats(cache_dir)
+        for k, v in increments.items():
+            stats[k] += v
+        if max_size is not None and stats['size'] > max_size:
+            stats['size'] = _evict(cache_dir, max_size * 9 // 10)
+        tmp = _stats_path(cache_dir) + '.%s' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump(stats, f)
+        os.replace(tmp, _stats_path(cache_dir))
+    finally:
+        if lock is not None:
+            lock.close()
+
+def _entries(cache_dir):
+    objects = os.path.join(cache_dir, 'objects')
+    if not os.path.isdir(objects):
+        return
+    for d in os.listdir(objects):
+        d = os.path.join(objects, d)
+        for f in os.listdir(d):
+            if f.endswith('.o'):
+                yield os.path.join(d, f[:-2])
+
+def _entry_size(entry):
+    size = 0
+    for ext in ('.o', '.stderr'):
+        try:
+            size += os.stat(entry + ext).st_size
+        except OSError:
+            pass
+    return size
+
+def _evict(cache_dir, size):
+    """Remove least recently used entries until the cache fits in `size`.
+    Returns the new cache size.
+    """
+    entries = []
+    total = 0
+    for entry in _entries(cache_dir):
+        try:
+            mtime = os.stat(entry + '.o').st_mtime
+        except OSError:
+            continue
+        entry_size = _entry_size(entry)
+        total += entry_size
+        entries.append((mtime, entry, entry_size))
+    entries.sort()
+    for _, entry, entry_size in entries:
+        if total <= size:
+            break
+        for ext in ('.o', '.stderr'):
+            try:
+                os.unlink(entry + ext)
+            except OSError:
+                pass
+        total -= entry_size
+    return total
+
+def _parse_command(args):
+    """Returns the object path and the arguments without it."""
+    object = None
+    other = []
+    it = iter(args)
+    for arg in it:
+        if arg == '-o':
+            object = next(it)
+        elif arg.startswith('-o') and len(arg) > 2:
+            object = arg[2:]
+        else:
+            other.append(arg)
+    return object, other
+
+def _binary_identity(binary):
+    st = os.stat(binary)
+    return repr((VERSION, binary, st.st_size, st.st_mtime_ns)).encode('utf8')
+
+def cache_key(compiler, args):
+    """Returns the cache key of an object, or None if it cannot be cached."""
+    object, args = _parse_command(args)
+    if object is None or '-c' not in args:
+        return None
+    h = hashlib.sha1()
+    h.update(_binary_identity(compiler))
+    h.update(b'\0'.join(a.encode('utf8') for a in args))
+    if any(a.startswith('-g') and a != '-g0' for a in args):
+        h.update(b'\0cwd\0' + os.getcwd().encode('utf8'))
+    preprocess = [compiler] + [a == '-c' and '-E' or a for a in args]
+    with subprocess.Popen(
+        preprocess,
+        stdout = subprocess.PIPE,
+        stderr = subprocess.DEVNULL,
+    ) as p:
+        while True:
+            chunk = p.stdout.read(1 << 16)
+            if not chunk:
+                break
+            h.update(chunk)
+    if p.returncode != 0:
+        return None
+    return h.hexdigest()
+
+def _file_digest(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.digest()
+
+def _driver_output(command, flag):
+    """Returns the output of the compiler driver `command[0]` called with
+    `flag` (and the linker selection flags of `command`), or None.
+    """
+    args = [command[0]] + [a for a in command[1:] if a.startswith('-fuse-ld=')] + [flag]
+    try:
+        p = subprocess.run(
+            args,
+            stdout = subprocess.PIPE,
+            stderr = subprocess.DEVNULL,
+            universal_newlines = True,
+        )
+    except OSError:
+        return None
+    return p.returncode == 0 and p.stdout.strip() or None
+
+def _linker_identity(command):
+    """Returns the identity of the linker run by a compiler driver, or
+    b'' when it cannot be found.
+    """
+    linker = _driver_output(command, '-print-prog-name=ld')
+    if linker is not None and not os.path.isabs(linker):
+        linker = shutil.which(linker)
+    if linker is None or not os.path.isfile(linker):
+        return b''
+    return _binary_identity(linker)
+
+def _default_library_directories(command):
+    """Returns the library search directories of a compiler driver."""
+    output = _driver_output(command, '-print-search-dirs') or ''
+    for line in output.split('\n'):
+        if line.startswith('libraries:'):
+            return [d for d in line.split('=', 1)[-1].split(os.pathsep) if d]
+    return []
+
+def find_library(name, directories, static = False):
+    """Returns the files a linker could pick for `-l<name>` in the first
+    directory containing one of them, or None.
+    """
+    if name.startswith(':'):
+        candidates = [name[1:]]
+    elif static:
+        candidates = ['lib%s.a' % name]
+    else:
+        candidates = ['lib%s%s' % (name, ext) for ext in ('.so', '.dylib', '.a')]
+    for d in directories:
+        files = [
+            os.path.join(d, c) for c in candidates
+            if os.path.isfile(os.path.join(d, c))
+        ]
+        if files:
+            return files
+    return None
+
+def _parse_link_command(args):
+    """Returns (library directories, library names, other arguments) of a
+    link command.
+    """
+    directories, libraries, other = [], [], []
+    it = iter(args)
+    for arg in it:
+        if arg == '-L':
+            directories.append(next(it, ''))
+        elif arg == '-l':
+            libraries.append(next(it, ''))
+        elif arg.startswith('-L'):
+            directories.append(arg[2:])
+        elif arg.startswith('-l'):
+            libraries.append(arg[2:])
+        else:
+            other.append(arg)
+    return directories, libraries, other
+
+def link_cache_key(command, output):
+    """Returns the cache key of a command producing `output`, or None if it
+    cannot be cached.
+    """
+    h = hashlib.sha1()
+    h.update(b'link\0' + _binary_identity(shutil.which(command[0]) or command[0]))
+    h.update(b'\0linker\0' + _linker_identity(command))
+    directories, libraries, _ = _parse_link_command(command[1:])
+    static = '-static' in command
+    defaults = None
+    for name in libraries:
+        files = find_library(name, directories, static)
+        if files is None:
+            if defaults is None:
+                defaults = _default_library_directories(command)
+            files = find_library(name, defaults, static)
+        if files is None:
+            return None
+        for f in files:
+            h.update(b'\0' + f.encode('utf8') + _file_digest(f))
+    for arg in command[1:]:
+        if arg == output:
+            h.update(b'\0<output>')
+            continue
+        h.update(b'\0' + arg.encode('utf8'))
+        if arg.startswith('-Wl,'):
+            files = arg.split(',')[1:]
+        else:
+            files = [arg]
+        for f in files:
+            if f != output and os.path.isfile(f):
+                h.update(_file_digest(f))
+    return h.hexdigest()
+
+def _pack(stderr, mode, data):
+    """Remote entry: stderr size, file mode, stderr and file content."""
+    return len(stderr).to_bytes(8, 'little') + mode.to_bytes(4, 'little') + stderr + data
+
+def _unpack(blob):
+    size = int.from_bytes(blob[:8], 'little')
+    mode = int.from_bytes(blob[8:12], 'little')
+    return blob[12:12 + size], mode, blob[12 + size:]
+
+def remote_get(url, key, timeout = 5):
+    """Returns the remote entry `key` (as given to remote_put), or None."""
+    import urllib.request
+    import urllib.error
+    try:
+        with urllib.request.urlopen('%s/%s' % (url.rstrip('/'), key), timeout = timeout) as r:
+            return r.read()
+    except (OSError, urllib.error.URLError):
+        return None
+
+def remote_put(url, key, data, timeout = 5):
+    """Upload an entry, returns True on success."""
+    import urllib.request
+    import urllib.error
+    request = urllib.request.Request(
+        '%s/%s' % (url.rstrip('/'), key),
+        data = data,
+        method = 'PUT',
+    )
+    try:
+        with urllib.request.urlopen(request, timeout = timeout) as r:
+            return r.status in (200, 201, 204)
+    except (OSError, urllib.error.URLError):
+        return False
+
+def _store(cache_dir, entry, output, stderr):
+    os.makedirs(os.path.dirname(entry), exist_ok = True)
+    tmp = '%s.%s' % (entry, os.getpid())
+    if stderr:
+        with open(tmp + '.stderr', 'wb') as f:
+            f.write(stderr)
+        os.replace(tmp + '.stderr', entry + '.stderr')
+    shutil.copy(output, tmp + '.o')
+    os.replace(tmp + '.o', entry + '.o')
+
+def _write_stderr(data):
+    if data:
+        sys.stderr.buffer.write(data)
+        sys.stderr.flush()
+
+def build_object(cache_dir, command, max_size = MAX_SIZE, output = None, remote = None):
+    """Run `command` through the cache, returns its status.
+
+    When `output` is None, `command` compiles an object (see cache_key()),
+    otherwise it produces the file `output` (see link_cache_key()).
+    """
+    if output is None:
+        output, _ = _parse_command(command[1:])
+        key = cache_key(command[0], command[1:])
+    else:
+        key = link_cache_key(command, output)
+    if key is None:
+        return subprocess.call(command)
+    entry = os.path.join(cache_dir, 'objects', key[:2], key[2:])
+    try:
+        shutil.copy(entry + '.o', output)
+        os.utime(entry + '.o')
+        if os.path.exists(entry + '.stderr'):
+            with open(entry + '.stderr', 'rb') as f:
+                _write_stderr(f.read())
+        _update_stats(cache_dir, hits = 1)
+        return 0
+    except OSError:
+        pass
+
+    blob = remote is not None and remote_get(remote, key) or None
+    if blob is not None:
+        stderr, mode, data = _unpack(blob)
+        tmp = '%s.%s' % (output, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, mode & 0o777)
+        os.replace(tmp, output)
+        _write_stderr(stderr)
+        _store(cache_dir, entry, output, stderr)
+        _update_stats(
+            cache_dir,
+            max_size = max_size * 1024 * 1024,
+            remote_hits = 1,
+            size = _entry_size(entry),
+        )
+        return 0
+
+    p = subprocess.Popen(command, stderr = subprocess.PIPE)
+    _, stderr = p.communicate()
+    _write_stderr(stderr)
+    if p.returncode != 0:
+        return p.returncode
+
+    _store(cache_dir, entry, output, stderr)
+    if remote is not None:
+        with open(output, 'rb') as f:
+            mode = os.fstat(f.fileno()).st_mode & 0o777
+            remote_put(remote, key, _pack(stderr, mode, f.read()))
+    _update_stats(
+        cache_dir,
+        max_size = max_size * 1024 * 1024,
+        misses = 1,
+        size = _entry_size(entry),
+    )
+    return 0
+
+def main(argv):
+    if len(argv) == 3 and argv[1] in ('--stats', '--clear'):
+        cache_dir = argv[2]
+        if argv[1] == '--clear':
+            shutil.rmtree(cache_dir, ignore_errors = True)
+            return 0
+        stats = read_stats(cache_dir)
+        total = stats['hits'] + stats['remote_hits'] + stats['misses']
+        print("Object cache:", cache_dir)
+        print("  hits:        %d (%.1f%%)" % (stats['hits'], total and 100.0 * stats['hits'] / total))
+        print("  remote hits: %d (%.1f%%)" % (stats['remote_hits'], total and 100.0 * stats['remote_hits'] / total))
+        print("  misses:      %d" % stats['misses'])
+        print("  size:        %.1f MB" % (stats['size'] / (1024 * 1024)))
+        return 0
+    args = argv[1:]
+    options = {'max_size': MAX_SIZE}
+    while len(args) > 1 and args[0] in ('--max-size', '--output', '--remote'):
+        options[args[0][2:].replace('-', '_')] = args[1]
+        args = args[2:]
+    if len(args) < 3 or args[1] != '--':
+        print(
+            "usage: %s [--max-size MB] [--output FILE] [--remote URL] CACHE_DIR -- COMMAND..." % argv[0],
+            "       %s --stats|--clear CACHE_DIR" % argv[0],
+            sep = '\n',
+            file = sys.stderr
+        )
+        return 2
+    options['max_size'] = int(options['max_size'])
+    cache_dir = args[0]
+    os.makedirs(cache_dir, exist_ok = True)
+    return build_object(cache_dir, args[2:], **options)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
+
+
+from unittest import TestCase
+import tempfile
+
+class _(TestCase):
+
+    def test_hit(self):
+        gcc = shutil.which('gcc')
+        if gcc is None:
+            self.skipTest("gcc not found")
+        with tempfile.TemporaryDirectory() as d:
+            cache_dir = os.path.join(d, 'cache')
+            os.makedirs(cache_dir)
+            src = os.path.join(d, 'test.c')
+            with open(src, 'w') as f:
+                f.write('int answer() { return 42; }\n')
+            for i in range(3):
+                obj = os.path.join(d, 'test%s.o' % i)
+                self.assertEqual(build_object(cache_dir, [gcc, '-c', src, '-o', obj]), 0)
+                self.assertTrue(os.path.isfile(obj))
+            stats = read_stats(cache_dir)
+            self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+            self.assertEqual(stats['size'], os.stat(obj).st_size)
+
+    def test_link_cache_key(self):
+        gcc = shutil.which('gcc')
+        if gcc is None:
+            self.skipTest("gcc not found")
+        with tempfile.TemporaryDirectory() as d:
+            lib = os.path.join(d, 'libfoo.a')
+            with open(lib, 'wb') as f:
+                f.write(b'v1')
+            command = [gcc, 'main.o', '-L', d, '-lfoo', '-o', 'main']
+            key = link_cache_key(command, 'main')
+            self.assertEqual(link_cache_key(command, 'main'), key)
+            with open(lib, 'wb') as f:
+                f.write(b'v2')
+            self.assertNotEqual(link_cache_key(command, 'main'), key)
+            self.assertIsNone(link_cache_key(command + ['-lmissing-library'], 'main'))
+            self.assertEqual(find_library('foo', ['/nonexistent', d]), [lib])
+            self.assertEqual(find_library('foo', [d], static = True), [lib])
+            self.assertEqual(find_library(':libfoo.a', [d]), [lib])
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as d:
+            for i in range(4):
+                entry = os.path.join(d, 'objects', '0%s' % i, 'entry')
+                os.makedirs(os.path.dirname(entry))
+                with open(entry + '.o', 'wb') as f:
+                    f.write(b'x' * 10)
+                os.utime(entry + '.o', (i, i))
+            self.assertEqual(_evict(d, 25), 20)
+            self.assertEqual(
+                sorted(os.path.basename(os.path.dirname(e)) for e in _entries(d)),
+                ['02', '03']
+            )
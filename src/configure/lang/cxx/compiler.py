@@ -4,7 +4,7 @@ from configure import Source
 import configure.compiler
 
 class CXXSource(Source):
-    pass
+    __slots__ = ()
 
 class Compiler(configure.compiler.Compiler):
     binary_env_varname = 'CXX'
@@ -1,8 +1,8 @@
 # -*- encoding: utf-8 -*-
 
+import sys
 from types import GeneratorType
 from . import path as PATH
-from . import tools
 
 class Node:
     __slots__ = ('__dependencies', 'path', 'build', 'is_directory', 'shell_formatter')
@@ -19,11 +19,10 @@ class Node:
         assert isinstance(dependencies, list)
         assert PATH.is_absolute(path)
         self.__dependencies = dependencies
-        self.path = path
+        self.path = sys.intern(path)
         self.build = build
         self.is_directory = is_directory
-        if shell_formatter is None:
-            shell_formatter = lambda e: [e]
+        # None stands for the default formatter (see shell()).
         self.shell_formatter = shell_formatter
 
     @property
@@ -52,16 +51,14 @@ class Node:
         return PATH.relative(self.path, start = start)
 
     def shell(self, start = None):
-        if start is None:
-            return self.shell_formatter(self.path)
-        return self.shell_formatter(self.relative_path(start))
+        p = start is None and self.path or self.relative_path(start)
+        if self.shell_formatter is None:
+            return [p]
+        return self.shell_formatter(p)
 
-    def visit(self, visitor):
-        if visitor(self) is False:
-            return
-        tools.debug('visiting', self, 'dependencies', self.dependencies)
-        for dep in self.dependencies:
-            dep.visit(visitor)
+    def visit(self, visitor, seen = None):
+        """Visit this node and its dependencies (see `visit()`)."""
+        visit([self], visitor, seen = seen)
 
     def __repr__(self):
         return "<%s %s>" % (
@@ -70,6 +67,42 @@ class Node:
         )
 
 
+def visit(nodes, visitor, seen = None):
+    """Call `visitor` once on each node reachable from `nodes`.
+
+    Nodes are visited depth first, before their dependencies, which are not
+    visited when the visitor returns False. Already visited nodes are
+    tracked in the `seen` set, which can be shared among calls.
+    """
+    if seen is None:
+        seen = set()
+    stack = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        if visitor(node) is False:
+            continue
+        stack.extend(reversed(node.dependencies))
+    return seen
+
+def walk(nodes):
+    """Yield nodes reachable from `nodes` once, dependencies first."""
+    seen = set()
+    stack = [(node, False) for node in reversed(nodes)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+            continue
+        if node in seen:
+            continue
+        seen.add(node)
+        stack.append((node, True))
+        stack.extend((dep, False) for dep in reversed(node.dependencies) if dep not in seen)
+
+
 from unittest import TestCase
 
 class _(TestCase):
@@ -77,6 +110,37 @@ class _(TestCase):
     def test_init(self):
         n = Node(None, '/pif/paf')
 
+    def test_visit_once(self):
+        # Diamonds: each layer depends on both nodes of the previous one
+        layers = [[Node(None, '/leaf')]]
+        for i in range(30):
+            layers.append([
+                Node(None, '/n%s-%s' % (i, j), dependencies = list(layers[-1]))
+                for j in range(2)
+            ])
+        visited = []
+        visit(layers[-1], visited.append)
+        self.assertEqual(len(visited), 61)
+        self.assertEqual(len(set(visited)), 61)
+        self.assertIs(visited[0], layers[-1][0])
+
+        order = list(walk(layers[-1]))
+        self.assertEqual(len(order), 61)
+        position = dict((n, i) for i, n in enumerate(order))
+        for n in order:
+            for dep in n.dependencies:
+                self.assertLess(position[dep], position[n])
+
+    def test_visit_stop(self):
+        leaf = Node(None, '/leaf')
+        root = Node(None, '/root', dependencies = [leaf])
+        visited = []
+        def visitor(node):
+            visited.append(node)
+            return False
+        root.visit(visitor)
+        self.assertEqual(visited, [root])
+
     def test_invalid_path(self):
         invalid_paths = [
             '.', './', 'pif', '..'
@@ -1,7 +1,9 @@
 # -*- encoding: utf-8 -*-
 
+import functools
 import os.path
 import stat
+import sys
 
 from . import platform
 
@@ -14,21 +16,41 @@ def basename(p, *paths):
 def splitext(p, *paths, **kw):
     return os.path.splitext(clean(p, *paths, **kw))
 
-def clean(p, *paths, **kw):
-    p = os.path.normpath(os.path.expanduser(os.path.join(p, *paths)))
-    if kw.get('real'):
+# Bounds of the memoized paths (see `cache_info()`)
+CLEAN_CACHE_SIZE = 1 << 16
+RELATIVE_CACHE_SIZE = 1 << 17
+
+def _clean(p, real = False, replace_home = False, absolute = False):
+    p = os.path.normpath(os.path.expanduser(p))
+    if real:
         p = os.path.realpath(p)
     if p.startswith('./'):
         return p[2:]
-    if kw.get('replace_home'):
+    if replace_home:
         p = os.path.join(
             '~',
             os.path.relpath(p, start=os.path.expanduser('~')),
         )
-    elif kw.get('absolute'):
+    elif absolute:
         p = os.path.abspath(p)
     return p.replace('\\', '/')
 
+@functools.lru_cache(maxsize = CLEAN_CACHE_SIZE)
+def _cached_clean(p):
+    return sys.intern(_clean(p))
+
+def clean(p, *paths, **kw):
+    """Returns a normalized path, with forward slashes.
+
+    Paths that do not depend on the current directory are memoized and
+    interned.
+    """
+    if paths:
+        p = os.path.join(p, *paths)
+    if not kw or (len(kw) == 1 and kw.get('absolute') and os.path.isabs(p)):
+        return _cached_clean(p)
+    return _clean(p, **kw)
+
 join = clean
 
 def dirname(p, *paths, **kw):
@@ -38,8 +60,81 @@ def absolute(p, *paths, **kw):
     kw['absolute'] = True
     return clean(p, *paths, **kw)
 
+def _is_clean_absolute(p):
+    """Fast check for an absolute path that `clean()` would not change."""
+    return p.startswith('/') and not (
+        '/.' in p or '//' in p or '\\' in p or '~' in p or
+        (p.endswith('/') and p != '/')
+    )
+
+def _start_parts(start):
+    """Returns the components of a clean absolute start directory and its
+    prefix.
+    """
+    return (
+        [part for part in start.split('/') if part],
+        start == '/' and '/' or start + '/',
+    )
+
+def _relative_to(p, start, start_parts, prefix):
+    """Returns `p` relative to `start`, both being clean absolute paths."""
+    if p == start:
+        return '.'
+    if p.startswith(prefix):
+        return p[len(prefix):]
+    parts = [part for part in p.split('/') if part]
+    common = 0
+    for a, b in zip(parts, start_parts):
+        if a != b:
+            break
+        common += 1
+    return '/'.join(['..'] * (len(start_parts) - common) + parts[common:])
+
+@functools.lru_cache(maxsize = RELATIVE_CACHE_SIZE)
+def _cached_relative(p, start):
+    if platform.IS_WINDOWS:
+        return clean(os.path.relpath(p, start=start))
+    start = clean(start)
+    return sys.intern(_relative_to(clean(p), start, *_start_parts(start)))
+
 def relative(p, *path, start=None, **kw):
-    return clean(os.path.relpath(os.path.join(p, *path), start=start), **kw)
+    if path:
+        p = os.path.join(p, *path)
+    if not kw and start is not None and (
+        (p.startswith('/') and start.startswith('/')) or
+        (platform.IS_WINDOWS and os.path.isabs(p) and os.path.isabs(start))
+    ):
+        return _cached_relative(p, start)
+    return clean(os.path.relpath(p, start=start), **kw)
+
+def relatives(paths, start):
+    """Returns a list of `paths` relative to `start`, as `relative()` would
+    do for each of them. The start directory is split only once.
+    """
+    start = absolute(start)
+    if platform.IS_WINDOWS:
+        return [relative(p, start = start) for p in paths]
+    start_parts, prefix = _start_parts(start)
+    return [
+        _relative_to(
+            _is_clean_absolute(p) and p or absolute(p),
+            start,
+            start_parts,
+            prefix
+        )
+        for p in paths
+    ]
+
+def cache_info():
+    """Returns the cache statistics of `clean()` and `relative()`."""
+    return {
+        'clean': _cached_clean.cache_info(),
+        'relative': _cached_relative.cache_info(),
+    }
+
+def clear_cache():
+    _cached_clean.cache_clear()
+    _cached_relative.cache_clear()
 
 def is_absolute(p, *path):
     return os.path.isabs(os.path.join(p, *path))
@@ -90,3 +185,23 @@ class _(TestCase):
         self.assertEqual(split('pif/../paf'), ('.', 'paf'))
         self.assertEqual(split('pif/paf'), ('pif', 'paf'))
 
+    def test_relative(self):
+        self.assertEqual(relative('/a/b/c', start = '/a'), 'b/c')
+        self.assertEqual(relative('/a', start = '/a/b/c'), '../..')
+        self.assertEqual(relative('/a/b', start = '/a/b'), '.')
+        self.assertEqual(relative('/a', 'b', start = '/a/c'), '../b')
+        self.assertEqual(relative('b', start = '.'), 'b')
+        self.assertEqual(relative('/a//b/', start = '/a/./c/'), '../b')
+        self.assertEqual(relative('/', start = '/a'), '..')
+        self.assertIs(relative('/a/b/c', start = '/a'), relative('/a/b/c', start = '/a'))
+
+    def test_relatives(self):
+        paths = [
+            '/a/b/c', '/a/b', '/a', '/', '/a/bb', '/a/b/../d', '/x/y', '/a/b/c/',
+            '/a//b', '/a/./b', '/a/.b',
+        ]
+        for start in ('/a/b', '/', '/a/b/c/d', '/x'):
+            self.assertEqual(
+                relatives(paths, start),
+                [relative(p, start = start) for p in paths],
+            )
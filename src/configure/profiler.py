@@ -0,0 +1,122 @@
+# -*- encoding: utf-8 -*-
+
+"""Time spent in configure phases.
+
+Phases are timed only when enabled (see the --profile flag of
+bin/configure):
+
+    with profiler.phase('generate'):
+        ...
+
+The wall time, CPU time and number of calls are accumulated by phase name.
+Phases can be nested: the time of a phase includes the time of the phases
+it contains.
+"""
+
+import functools
+import time
+
+from . import tools
+
+ENABLED = False
+
+# Phase name -> [wall time, cpu time, calls]
+_phases = {}
+
+class _Phase:
+
+    __slots__ = ('name', 'wall', 'cpu')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        stats = _phases.setdefault(self.name, [0.0, 0.0, 0])
+        stats[0] += time.perf_counter() - self.wall
+        stats[1] += time.process_time() - self.cpu
+        stats[2] += 1
+
+class _DisabledPhase:
+
+    __slots__ = ('name',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        pass
+
+_disabled_phase = _DisabledPhase()
+
+def phase(name):
+    """Returns a context manager timing a phase. The phase name can be
+    changed before the end of the phase by setting its `name` attribute.
+    """
+    if not ENABLED:
+        return _disabled_phase
+    return _Phase(name)
+
+def timed(name):
+    """Decorator timing calls of a function as the phase `name`."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kw):
+            with phase(name):
+                return function(*args, **kw)
+        return wrapper
+    return decorator
+
+def stats():
+    """Returns a dict of phase names to their (wall time, cpu time, calls)."""
+    return dict((k, tuple(v)) for k, v in _phases.items())
+
+def reset():
+    _phases.clear()
+
+def report():
+    """Print the phases, longest first."""
+    tools.status("%-48s %10s %10s %8s" % ("Phase", "Wall (s)", "CPU (s)", "Calls"))
+    for name, (wall, cpu, calls) in sorted(_phases.items(), key = lambda i: -i[1][0]):
+        tools.status("%-48s %10.3f %10.3f %8d" % (name, wall, cpu, calls))
+
+
+from unittest import TestCase
+
+class _(TestCase):
+
+    def setUp(self):
+        self.enabled = ENABLED
+        self.phases = dict(_phases)
+        reset()
+
+    def tearDown(self):
+        global ENABLED
+        ENABLED = self.enabled
+        reset()
+        _phases.update(self.phases)
+
+    def test_disabled(self):
+        global ENABLED
+        ENABLED = False
+        with phase('a'):
+            pass
+        self.assertEqual(stats(), {})
+
+    def test_phases(self):
+        global ENABLED
+        ENABLED = True
+        for i in range(3):
+            with phase('a'):
+                with phase('b') as p:
+                    p.name = 'c'
+                    time.sleep(0.001)
+        s = stats()
+        self.assertEqual(sorted(s.keys()), ['a', 'c'])
+        self.assertEqual(s['a'][2], 3)
+        self.assertGreaterEqual(s['a'][0], s['c'][0])
+        self.assertGreater(s['c'][0], 0.003)
@@ -7,6 +7,8 @@ from .env import Env
 from . import path
 from . import tools
 from . import templates
+from . import build_cache
+from . import profiler
 
 from .build import Build
 
@@ -71,7 +73,8 @@ class Project:
                 "The directory '%s' does not seem to contain a configuration" % self.directory
             )
         self.project_env_file = path.join(self.config_directory, self.project_env_filename)
-        self.__read_conf()
+        with profiler.phase('project file'):
+            self.__read_conf()
         self.env.update(new_project_env)
 
     def __enter__(self):
@@ -90,13 +93,16 @@ class Project:
                      build_dir,
                      new_build_env,
                      configure_function,
-                     generator_name):
+                     generator_name,
+                     use_cache = True):
             self.project = project
             self.build_dir = build_dir
             self.configure_function  = configure_function
             self.new_build_env = new_build_env
             self.generator_name = generator_name
+            self.use_cache = use_cache
             self.build = None
+            self.cache_entry = None
             self.build_env_file = path.join(
                 self.build_dir,
                 self.project.build_env_filename
@@ -110,20 +116,46 @@ class Project:
             else:
                 env = Env(**kw)
             env.update(self.new_build_env)
-            self.build = Build(
-                self.project,
-                directory = self.build_dir,
-                generator_name = self.generator_name,
-                env = env
-            )
-            self.configure_function(self.build)
+            if self.use_cache:
+                with profiler.phase('configure cache'):
+                    self.build, self.cache_entry = build_cache.load(
+                        self.project,
+                        self.build_dir,
+                        env,
+                        generator_name = self.generator_name
+                    )
+            if self.build is None:
+                tools.INPUTS.clear()
+                with profiler.phase('main'):
+                    self.build = Build(
+                        self.project,
+                        directory = self.build_dir,
+                        generator_name = self.generator_name,
+                        env = env
+                    )
+                    self.configure_function(self.build)
+                with profiler.phase('configure cache'):
+                    self.cache_entry = build_cache.dump(self.build)
             return self.build
 
         def __exit__(self, type_, value, traceback):
             self.build.env.save(self.build_env_file)
+            if type_ is None and self.build.generated and self.cache_entry is not None:
+                with profiler.phase('configure cache'):
+                    build_cache.save(self.build, self.cache_entry)
             self.build.cleanup()
 
-    def configure(self, build_dir, new_build_vars = {}, generator_name = None):
+    def configure(self,
+                  build_dir,
+                  new_build_vars = {},
+                  generator_name = None,
+                  use_cache = True):
+        """Returns a context manager yielding the configured build.
+
+        When `use_cache` is True, the build is loaded from the configure
+        cache when possible (see build_cache.py). The cache is refreshed in
+        any case once the build has been generated.
+        """
         if self.__configure_function is None:
             raise Exception(
                 "The project file %s did not define any `main` function"
@@ -136,6 +168,7 @@ class Project:
             new_build_vars,
             self.__configure_function,
             generator_name = generator_name,
+            use_cache = use_cache,
         )
 
     def __read_conf(self):
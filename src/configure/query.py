@@ -0,0 +1,233 @@
+# -*- encoding: utf-8 -*-
+
+"""Build graph queries.
+
+    $ configure query deps build/test.exe       # what it is built from
+    $ configure query rdeps src/common.c        # what is rebuilt when it changes
+    $ configure query path build/test.exe src/common.c
+
+Queries run on the compact graph of a build (see graph.py): the dependencies
+and the dependents of every node are indexed once, each query is then a
+breadth-first walk of these indexes.
+
+Headers are not nodes of the build: the graph is completed with the headers
+of each compiled target, read from the dependency files written by the
+compiler or found by scanning sources (through the header cache of the
+build directory, see generators/find_dependencies.py).
+"""
+
+from collections import deque
+import os
+
+from . import path
+from . import tools
+from .graph import Graph
+
+KINDS = {
+    # Query kind -> number of node arguments
+    'deps': 1,
+    'rdeps': 1,
+    'path': 2,
+}
+
+def header_dependencies(build):
+    """Returns a dict of targets (absolute paths) to the headers they depend
+    on. Targets built with dependency files that do not exist yet (never
+    built) have no headers.
+    """
+    from .command import Command
+    from .compiler import IncludeDirectory
+    from .lang.c.compiler import CSource
+    from .lang.cxx.compiler import CXXSource
+    from .generators import find_dependencies
+    from .target import Target
+
+    commands = []
+    def visit(node):
+        if isinstance(node, (Target, Command)) and node.build is not build:
+            return False
+        if isinstance(node, Command):
+            commands.append(node)
+    build.visit(visit)
+
+    res = {}
+    cache = find_dependencies.HeaderCache(
+        path.join(build.directory, find_dependencies.CACHE_FILENAME),
+        preload = True
+    )
+    try:
+        index = find_dependencies.IncludeIndex(cache)
+        memo = {}
+        for cmd in tools.unique(commands):
+            headers = res.setdefault(cmd.target.path, set())
+            if cmd.depfile is not None:
+                try:
+                    prerequisites = find_dependencies.read_depfile(cmd.depfile)
+                except OSError:
+                    continue
+                headers.update(
+                    path.absolute(cmd.working_directory, p) for p in prerequisites
+                )
+                continue
+            include_directories = [
+                d.path for d in cmd.find_instances(IncludeDirectory)
+            ] + list(cmd.system_include_directories)
+            for input in cmd.dependencies + cmd.target.dependencies:
+                if isinstance(input, (CSource, CXXSource)) and path.exists(input.path):
+                    headers.update(
+                        path.absolute(h) for h in find_dependencies.scan_file(
+                            input.path, include_directories, cache, memo, index
+                        )
+                    )
+    finally:
+        cache.close()
+    return res
+
+def build_graph(build):
+    """Returns the graph of a build with its header dependencies (headers
+    are 'Header' nodes).
+    """
+    graph = build.graph()
+    headers = header_dependencies(build)
+    res = Graph()
+    for id in range(len(graph)):
+        res.add_node(graph.path(id), graph.kind(id))
+    for id in range(len(graph)):
+        for dep in graph.dependencies(id):
+            res.add_edge(id, dep)
+    for target, paths in sorted(headers.items()):
+        id = res.id(target)
+        if id is None:
+            continue
+        known = set(graph.dependencies(id))
+        for p in sorted(paths):
+            dep = res.id(p)
+            if dep is None:
+                dep = res.add_node(p, 'Header')
+            if dep != id and dep not in known:
+                known.add(dep)
+                res.add_edge(id, dep)
+    return res.freeze()
+
+def find_node(graph, build, name):
+    """Returns the id of the node `name` (an absolute path or a path relative
+    to the current directory, the build directory or the project directory),
+    or None.
+    """
+    if path.is_absolute(name):
+        candidates = [name]
+    else:
+        candidates = [
+            path.join(d, name)
+            for d in (os.getcwd(), build.directory, build.project.directory)
+        ]
+    for candidate in candidates:
+        id = graph.id(path.absolute(candidate))
+        if id is not None:
+            return id
+    return None
+
+def reachable(graph, id, edges):
+    """Returns the ids of the nodes reachable from `id` through `edges`
+    (`graph.dependencies` or `graph.dependents`), nearest first.
+    """
+    seen = set([id])
+    queue = deque([id])
+    res = []
+    while queue:
+        for next in edges(queue.popleft()):
+            if next not in seen:
+                seen.add(next)
+                res.append(next)
+                queue.append(next)
+    return res
+
+def dependencies(graph, id):
+    """Ids of the direct and indirect dependencies of a node."""
+    return reachable(graph, id, graph.dependencies)
+
+def dependents(graph, id):
+    """Ids of the nodes depending directly or indirectly on a node."""
+    return reachable(graph, id, graph.dependents)
+
+def dependency_path(graph, source, destination):
+    """Returns the shortest chain of ids from `source` to its dependency
+    `destination` (both included), or None.
+    """
+    parents = {source: None}
+    queue = deque([source])
+    while queue:
+        id = queue.popleft()
+        if id == destination:
+            res = []
+            while id is not None:
+                res.append(id)
+                id = parents[id]
+            return res[::-1]
+        for dep in graph.dependencies(id):
+            if dep not in parents:
+                parents[dep] = id
+                queue.append(dep)
+    return None
+
+def run(build, kind, names):
+    """Print the result of a query on a build, returns the ids found.
+
+    positional arguments:
+
+        build: The build instance
+        kind: One of `KINDS`
+        names: Node arguments of the query
+    """
+    if KINDS.get(kind) != len(names):
+        raise Exception("Invalid query: %s %s" % (kind, ' '.join(names)))
+    graph = build_graph(build)
+    ids = []
+    for name in names:
+        id = find_node(graph, build, name)
+        if id is None:
+            tools.fatal("No node '%s' in the build '%s'" % (name, build.directory))
+        ids.append(id)
+
+    if kind == 'path':
+        res = dependency_path(graph, ids[0], ids[1])
+        if res is None:
+            res = dependency_path(graph, ids[1], ids[0])
+        if res is None:
+            tools.status("%s and %s do not depend on each other" % tuple(names))
+            return []
+    elif kind == 'deps':
+        res = dependencies(graph, ids[0])
+    else:
+        res = dependents(graph, ids[0])
+
+    # Command nodes are an implementation detail of their targets
+    res = [id for id in res if graph.kind(id) != 'Command']
+    cwd = os.getcwd()
+    for id in res:
+        print(graph.kind(id), path.relative(graph.path(id), start = cwd))
+    if kind != 'path':
+        tools.verbose("%s nodes found" % len(res))
+    return res
+
+
+from unittest import TestCase
+
+class _(TestCase):
+
+    def test_queries(self):
+        from .graph import Graph
+        g = Graph()
+        # app -> (main.o, lib), lib -> (a.o), main.o -> (main.c, a.h), a.o -> (a.c, a.h)
+        a_h, a_c, main_c = [g.add_node(p, 'Source') for p in ('/a.h', '/a.c', '/main.c')]
+        a_o, main_o, lib, app = [g.add_node(p, 'Target') for p in ('/a.o', '/main.o', '/lib', '/app')]
+        for node, dep in [(a_o, a_c), (a_o, a_h), (main_o, main_c), (main_o, a_h),
+                          (lib, a_o), (app, main_o), (app, lib)]:
+            g.add_edge(node, dep)
+        g.freeze()
+        self.assertEqual(set(dependents(g, a_h)), set([a_o, main_o, lib, app]))
+        self.assertEqual(dependents(g, app), [])
+        self.assertEqual(set(dependencies(g, lib)), set([a_o, a_c, a_h]))
+        self.assertEqual(dependency_path(g, app, a_c), [app, lib, a_o, a_c])
+        self.assertEqual(dependency_path(g, app, a_h), [app, main_o, a_h])
+        self.assertIsNone(dependency_path(g, a_c, app))
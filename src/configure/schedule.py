@@ -0,0 +1,145 @@
+# -*- encoding: utf-8 -*-
+
+"""Critical path scheduling of build commands.
+
+The duration of each command is recorded in a log of the build directory
+(see generators/run_command.py). The priority of a command is the length of
+the longest chain of commands starting with it, so that commands starting
+long chains (or long commands) are run first.
+"""
+
+import os
+
+from . import tools
+
+# Duration (in seconds) assumed when nothing has been recorded at all.
+DEFAULT_DURATION = 1.0
+
+def durations_path(build):
+    """Path of the duration log of a build."""
+    from .generators import run_command
+    return run_command.duration_log_path(build.command_manifest)
+
+def load_durations(build):
+    """Returns the last recorded duration of commands by key.
+
+    The log is compacted when it contains too many obsolete lines.
+    """
+    from .generators import run_command
+    log = durations_path(build)
+    try:
+        with open(log) as f:
+            lines = f.readlines()
+    except OSError:
+        return {}
+    durations = {}
+    for line in lines:
+        key, _, seconds = line.rstrip('\n').rpartition('\t')
+        try:
+            durations[key] = float(seconds)
+        except ValueError:
+            continue
+    if len(lines) > 2 * len(durations) + 100:
+        tools.debug("Compacting", log)
+        tmp = log + '.tmp'
+        with open(tmp, 'w') as f:
+            f.writelines(
+                run_command.duration_line(k, v) for k, v in durations.items()
+            )
+        os.replace(tmp, log)
+    return durations
+
+def record_duration(build, key, seconds):
+    """Append a command duration to the log of a build."""
+    from .generators import run_command
+    run_command.append_line(durations_path(build), run_command.duration_line(key, seconds))
+
+def priorities(dependencies, durations):
+    """Returns the critical path length of each key.
+
+    positional arguments:
+
+        dependencies: A dict of keys to the keys they depend on.
+        durations: A dict of keys to their duration. Missing durations
+                   default to the average known duration.
+    """
+    known = [durations[k] for k in dependencies if k in durations]
+    default = known and sum(known) / len(known) or DEFAULT_DURATION
+
+    dependents = dict((k, []) for k in dependencies)
+    requires = {}
+    for key, deps in dependencies.items():
+        requires[key] = set(d for d in deps if d in dependents and d != key)
+        for dep in requires[key]:
+            dependents[dep].append(key)
+
+    # Visit keys when all their dependents are done.
+    waiting = dict((k, len(v)) for k, v in dependents.items())
+    stack = [k for k, count in waiting.items() if not count]
+    result = {}
+    while stack:
+        key = stack.pop()
+        result[key] = durations.get(key, default) + max(
+            (result[d] for d in dependents[key]),
+            default = 0
+        )
+        for dep in requires[key]:
+            waiting[dep] -= 1
+            if not waiting[dep]:
+                stack.append(dep)
+    # Keys left belong to dependency cycles
+    for key in dependencies:
+        if key not in result:
+            result[key] = durations.get(key, default)
+    return result
+
+def command_priorities(build, commands):
+    """Returns the priorities of commands given as a dict of keys to the
+    commands building the same target.
+    """
+    from .command import Command
+    producers = {}
+    for key, cmds in commands.items():
+        for cmd in cmds:
+            for output in cmd.outputs:
+                producers[output.path] = key
+    dependencies = {}
+    for key, cmds in commands.items():
+        deps = dependencies[key] = set()
+        for cmd in cmds:
+            for input in cmd.dependencies + cmd.target.dependencies:
+                if isinstance(input, Command):
+                    continue
+                producer = producers.get(input.path)
+                if producer is not None:
+                    deps.add(producer)
+    return priorities(dependencies, load_durations(build))
+
+
+from unittest import TestCase
+
+class _(TestCase):
+
+    def test_priorities(self):
+        # a.o -> lib -> exe, b.o -> exe
+        dependencies = {
+            'a.o': [],
+            'b.o': [],
+            'lib': ['a.o'],
+            'exe': ['lib', 'b.o'],
+        }
+        res = priorities(
+            dependencies,
+            {'a.o': 1, 'b.o': 5, 'lib': 2, 'exe': 3}
+        )
+        self.assertEqual(res, {'a.o': 6, 'b.o': 8, 'lib': 5, 'exe': 3})
+
+    def test_default_duration(self):
+        res = priorities({'a': [], 'b': ['a']}, {'a': 4})
+        self.assertEqual(res, {'a': 8, 'b': 4})
+        res = priorities({'a': [], 'b': ['a']}, {})
+        self.assertEqual(res, {'a': 2 * DEFAULT_DURATION, 'b': DEFAULT_DURATION})
+
+    def test_cycle(self):
+        res = priorities({'a': ['b'], 'b': ['a'], 'c': []}, {'a': 1, 'b': 1, 'c': 1})
+        self.assertEqual(res, {'a': 1, 'b': 1, 'c': 1})
@@ -5,7 +5,7 @@ from . import path as PATH
 
 class Target(Node):
 
-    #__slots__ = ()
+    __slots__ = ()
 
     def __init__(self, build, path, dependencies = None, shell_formatter = None):
         from .build import Build
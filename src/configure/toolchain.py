@@ -0,0 +1,94 @@
+# -*- encoding: utf-8 -*-
+
+"""Compiler probes cache.
+
+Probing a compiler (for its system include directories for example) means
+running it, for every build directory configured. Probe results are cached
+per binary in the project configuration directory, and probed again when the
+binary changes (modification time or size).
+"""
+
+import json
+import os
+
+from . import path
+from . import tools
+
+# Bump when the cache format changes
+VERSION = 1
+
+# (cache path, binary, probe name) -> result, for the current process
+_memo = {}
+
+def cache_path(project):
+    """Path of the toolchain cache of a project."""
+    return path.join(project.config_directory, '.toolchain-cache')
+
+def _stamp(binary):
+    st = os.stat(binary)
+    return [st.st_mtime_ns, st.st_size]
+
+def _load(filename):
+    try:
+        with open(filename) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {'version': VERSION, 'binaries': {}}
+    if not isinstance(cache, dict) or cache.get('version') != VERSION:
+        return {'version': VERSION, 'binaries': {}}
+    return cache
+
+def probe(project, binary, name, function):
+    """Returns the result of the probe `name` of `binary`, calling
+    `function()` only when it is not cached. Results must be JSON
+    serializable.
+
+    Results are kept in memory as well: the cache file is read and the
+    binary checked once per process and probe.
+    """
+    filename = cache_path(project)
+    key = (filename, binary, name)
+    if key in _memo:
+        return _memo[key]
+    cache = _load(filename)
+    stamp = _stamp(binary)
+    entry = cache['binaries'].get(binary)
+    if entry is None or entry['stamp'] != stamp:
+        entry = cache['binaries'][binary] = {'stamp': stamp, 'probes': {}}
+    if name in entry['probes']:
+        value = _memo[key] = entry['probes'][name]
+        return value
+    tools.debug("Probing", name, "of", binary)
+    value = _memo[key] = entry['probes'][name] = function()
+    tools.write_if_changed(
+        filename,
+        json.dumps(cache, indent = 0, sort_keys = True) + '\n'
+    )
+    return value
+
+
+from unittest import TestCase
+
+class _(TestCase):
+
+    def test_probe(self):
+        from .project import TemporaryProject
+        with TemporaryProject() as p:
+            binary = path.join(p.directory, 'cc')
+            with open(binary, 'w') as f:
+                f.write('v1')
+            calls = []
+            def function():
+                calls.append(1)
+                return ['/usr/include']
+            self.assertEqual(probe(p, binary, 'includes', function), ['/usr/include'])
+            self.assertEqual(probe(p, binary, 'includes', function), ['/usr/include'])
+            self.assertEqual(len(calls), 1)
+            with open(binary, 'w') as f:
+                f.write('v2 (bigger)')
+            # Not checked again in the same process
+            probe(p, binary, 'includes', function)
+            self.assertEqual(len(calls), 1)
+            _memo.clear()
+            probe(p, binary, 'includes', function)
+            self.assertEqual(len(calls), 2)
@@ -10,6 +10,9 @@ from . import platform
 DEBUG = False
 VERBOSE = True
 
+# Path of the configure script, set when run from it.
+CONFIGURE_SCRIPT = None
+
 def err(*args, **kwargs):
     kwargs.setdefault('file', sys.stderr)
     print(*args, **kwargs)
@@ -36,11 +39,24 @@ PATH_SPLIT_CHAR = platform.IS_WINDOWS and ';' or ':'
 
 PATH = os.environ['PATH'].split(PATH_SPLIT_CHAR)
 
+# Binaries and directories looked up while configuring a build (see
+# build_cache.py).
+INPUTS = set()
+
+def record_input(p):
+    """Record a file or a directory the build configuration depends on. It
+    does not have to exist: creating it changes the configuration as well.
+    """
+    INPUTS.add(path.absolute(p))
+
 def which(binary):
     for dir_ in PATH:
         exe = os.path.join(dir_, binary)
         if path.is_executable(exe):
+            record_input(exe)
             return exe
+        # Installing the binary here would change the result
+        record_input(dir_)
     if platform.IS_WINDOWS and not binary.lower().endswith('.exe'):
         return which(binary + '.exe')
     return None
@@ -53,6 +69,7 @@ def find_binary(name, env=None, var_name=None):
         if binary is not None and not path.is_absolute(binary):
             binary = which(binary)
         if binary is not None:
+            record_input(binary)
             return path.clean(binary)
     binary = which(name)
     if binary is None:
@@ -72,6 +89,7 @@ def glob(pattern, dir=None, recursive=False):
         pattern = os.path.basename(pattern)
 
     for root, dirnames, files in os.walk(dir):
+        record_input(root)
         for file_ in files:
             p = path.relative(root, file_, start=dir)
             if fnmatch(p, pattern):
@@ -123,11 +141,16 @@ def _walk(dir_):
     res = _walked.get(p)
 
     if res is None:
+        if not os.path.isdir(dir_):
+            # Searched before it exists
+            record_input(dir_)
         for root, dirs, files in os.walk(dir_):
+            record_input(root)
             _walked[p] = root, dirs, files
             yield root, dirs, files
     else:
         root, dirs, files = res
+        record_input(root)
         yield res
         for dir_ in dirs:
             yield _walk(path.join(root, dir_))
@@ -164,6 +187,34 @@ def find_files(working_directory='.',
     return results
 
 
+def write_if_changed(filename, content, mode = None):
+    """Write `content` (str or bytes) to `filename` when it differs from the
+    current content of the file, returns True when written.
+
+    The file is replaced atomically: a file written and renamed over the
+    previous one. When given, `mode` is applied to the written file.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf8')
+    try:
+        with open(filename, 'rb') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    tmp = '%s.%s.tmp' % (filename, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, filename)
+    except:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return True
+
 def unique(seq):
     seen = {}
     result = []
@@ -206,3 +257,16 @@ class _(TestCase):
                 yield "something"
         self.assertTrue(isiterable(gen()))
 
+    def test_write_if_changed(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as d:
+            f = os.path.join(d, 'f')
+            self.assertTrue(write_if_changed(f, 'pif'))
+            os.utime(f, ns = (0, 0))
+            self.assertFalse(write_if_changed(f, b'pif'))
+            self.assertEqual(os.stat(f).st_mtime_ns, 0)
+            self.assertTrue(write_if_changed(f, 'paf', mode = 0o744))
+            with open(f) as fd:
+                self.assertEqual(fd.read(), 'paf')
+            self.assertTrue(os.access(f, os.X_OK))
+            self.assertEqual(os.listdir(d), ['f'])
@@ -0,0 +1,151 @@
+# -*- encoding: utf-8 -*-
+
+"""Build timelines.
+
+When the TRACE build variable is set (see the --trace flag of
+bin/configure), every command run through configure.py scripts or the
+executor is logged in the trace log of its build directory (see
+generators/run_command.py). The log can be exported to the Chrome trace event
+format, readable by about:tracing or Perfetto (https://ui.perfetto.dev).
+
+Native commands (see the NATIVE_COMMANDS build variable) are run by the
+build system itself, they are not logged.
+"""
+
+import json
+import os
+
+from . import tools
+
+def enabled(build):
+    """True when the commands of a build are logged."""
+    return bool(build.env.get('TRACE', False))
+
+def trace_path(build):
+    """Path of the trace log of a build."""
+    from .generators import run_command
+    return run_command.trace_log_path(build.command_manifest)
+
+def record(build, start, end, pid, action, target, status):
+    """Append a command to the trace log of a build."""
+    from .generators import run_command
+    run_command.append_line(
+        trace_path(build),
+        run_command.trace_line(start, end, pid, action, target, status)
+    )
+
+def load(build):
+    """Returns the commands of the trace log of a build, sorted by start
+    time.
+    """
+    events = []
+    try:
+        with open(trace_path(build)) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    events.sort(key = lambda e: e['start'])
+    return events
+
+def _assign_lanes(events):
+    """Returns the lane of each event so that concurrent commands are
+    displayed on different rows.
+    """
+    lanes = []
+    res = []
+    for event in events:
+        for i, end in enumerate(lanes):
+            if end <= event['start']:
+                break
+        else:
+            i = len(lanes)
+            lanes.append(None)
+        lanes[i] = event['end']
+        res.append(i)
+    return res
+
+def chrome_trace(builds):
+    """Returns the trace event object of some builds (as a dict of build
+    names to their trace log commands).
+    """
+    trace = []
+    origin = min(
+        (e['start'] for events in builds.values() for e in events),
+        default = 0
+    )
+    for pid, (name, events) in enumerate(sorted(builds.items()), 1):
+        trace.append({
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': pid,
+            'args': {'name': name},
+        })
+        for event, lane in zip(events, _assign_lanes(events)):
+            trace.append({
+                'name': '%s %s' % (event['action'], event['target']),
+                'cat': event['status'] == 0 and 'command' or 'failed',
+                'ph': 'X',
+                'ts': int((event['start'] - origin) * 1e6),
+                'dur': int((event['end'] - event['start']) * 1e6),
+                'pid': pid,
+                'tid': lane,
+                'args': {
+                    'pid': event['pid'],
+                    'target': event['target'],
+                    'status': event['status'],
+                },
+            })
+    return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+def export(builds, filename, executed = False):
+    """Write the Chrome trace of some builds and reset their trace logs, so
+    that the next export only contains new commands.
+
+    Unless the builds were just `executed` (by the executor, which logs every
+    command), warn about builds whose native commands are missing.
+    """
+    if not executed:
+        for build in builds:
+            if build.env.get('NATIVE_COMMANDS', False):
+                tools.warning(
+                    "Warning: Native commands of '%s' are not traced" % build.directory,
+                    "(see --native-commands)"
+                )
+    logs = dict((build.directory, load(build)) for build in builds)
+    with open(filename, 'w') as f:
+        json.dump(chrome_trace(logs), f)
+    count = sum(len(events) for events in logs.values())
+    tools.status("Trace of %s commands written to" % count, filename)
+    for build in builds:
+        if os.path.exists(trace_path(build)):
+            os.unlink(trace_path(build))
+
+
+from unittest import TestCase
+
+class _(TestCase):
+
+    def test_lanes(self):
+        events = [
+            {'start': 0, 'end': 2},
+            {'start': 1, 'end': 3},
+            {'start': 2, 'end': 4},
+            {'start': 3, 'end': 4},
+        ]
+        self.assertEqual(_assign_lanes(events), [0, 1, 0, 1])
+
+    def test_chrome_trace(self):
+        events = [
+            {'start': 10, 'end': 11.5, 'pid': 42, 'action': 'Build', 'target': 'a.o', 'status': 0},
+            {'start': 10.5, 'end': 11, 'pid': 43, 'action': 'Build', 'target': 'b.o', 'status': 1},
+        ]
+        trace = chrome_trace({'build': events})['traceEvents']
+        self.assertEqual(trace[0]['args'], {'name': 'build'})
+        self.assertEqual(
+            [(e['ts'], e['dur'], e['tid'], e['cat']) for e in trace[1:]],
+            [(0, 1500000, 0, 'command'), (500000, 500000, 1, 'failed')]
+        )
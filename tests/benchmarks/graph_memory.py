@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+"""Measure the memory and time needed to hold large build graphs.
+
+    PYTHONPATH=src python tests/benchmarks/graph_memory.py
+
+Each object target depends on its source and on a set of shared headers, and
+every ten objects are linked together. The node graph is measured with and
+without a per-node shell formatter (as every node used to have one), then
+its compact snapshot (see configure/graph.py).
+"""
+
+import gc
+import time
+import tracemalloc
+
+from configure.build import Build
+from configure.graph import Graph
+from configure.project import TemporaryProject
+from configure.source import Source
+from configure.target import Target
+
+HEADERS = 50
+HEADERS_PER_OBJECT = 20
+
+def make_graph(build, count, formatter = False):
+    headers = [Source(build, 'include/h%s.h' % i) for i in range(HEADERS)]
+    objects = []
+    for i in range(count):
+        deps = [Source(build, 'src/s%s.c' % i)]
+        deps.extend(headers[(i + j) % HEADERS] for j in range(HEADERS_PER_OBJECT))
+        objects.append(Target(
+            build, 'obj/s%s.o' % i,
+            dependencies = deps,
+            shell_formatter = formatter and (lambda p: [p]) or None,
+        ))
+    for i in range(0, count, 10):
+        Target(
+            build, 'lib/l%s.a' % i,
+            dependencies = objects[i:i + 10],
+            shell_formatter = formatter and (lambda p: [p]) or None,
+        )
+
+def measure(function):
+    """Returns the result, the memory allocated and the peak memory of
+    `function`, and its duration (measured in a second run without memory
+    tracing, which slows allocations down).
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    return result, current, peak, duration
+
+def main():
+    print("%-30s %8s %12s %12s %10s" % ('', 'objects', 'current (MB)', 'peak (MB)', 'time (s)'))
+    for count in (10000, 50000):
+        for name, formatter in (('nodes (per-node formatter)', True), ('nodes', False)):
+            with TemporaryProject() as project:
+                def create():
+                    build = Build(project, project.directory + '/build', 'Makefile', save_generator = False)
+                    make_graph(build, count, formatter = formatter)
+                    return build
+                build, current, peak, duration = measure(create)
+                print("%-30s %8d %12.1f %12.1f %10.3f" % (name, count, current / 2**20, peak / 2**20, duration))
+                if not formatter:
+                    graph, current, peak, duration = measure(lambda: Graph.from_nodes(build.nodes()))
+                    print("%-30s %8d %12.1f %12.1f %10.3f" % ('compact graph snapshot', count, current / 2**20, peak / 2**20, duration))
+                del build
+
+if __name__ == '__main__':
+    main()
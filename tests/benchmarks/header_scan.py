@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+"""Benchmark the header scanner.
+
+    PYTHONPATH=src python tests/benchmarks/header_scan.py [JOBS]
+
+Generates a tree of 12000 headers in 30 include directories (modules of
+headers including each other and a common base module), and sources
+including headers of a few modules. Compares scanning each source on its own
+(one scanner process per target), with and without an include index (one
+directory listing instead of a stat() call per include directory), a batch
+scan sharing resolved includes,
+the same batch in a pool of JOBS processes (default to the number of CPUs),
+and a batch scan with a warm header cache.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from configure.generators.find_dependencies import (
+    CACHE_FILENAME,
+    HeaderCache,
+    IncludeIndex,
+    IncludeSolver,
+    scan_batch,
+)
+
+DIRECTORIES = 30
+MODULES = 120
+HEADERS_PER_MODULE = 100
+SOURCES = 500
+
+def header(module, i):
+    return 'module%s/h%s.h' % (module, i)
+
+def make_tree(root):
+    rand = random.Random(42)
+    include_directories = [os.path.join(root, 'include%s' % i) for i in range(DIRECTORIES)]
+    for module in range(MODULES):
+        directory = include_directories[module % DIRECTORIES]
+        os.makedirs(os.path.join(directory, 'module%s' % module))
+        for i in range(HEADERS_PER_MODULE):
+            includes = [header(module, j) for j in rand.sample(range(i), min(i, 3))]
+            if module:
+                includes.append(header(0, rand.randrange(HEADERS_PER_MODULE)))
+            with open(os.path.join(directory, header(module, i)), 'w') as f:
+                f.write('#pragma once\n')
+                for include in includes:
+                    f.write('#include <%s>\n' % include)
+                f.write('int f%s_%s(void);\n' % (module, i))
+    sources = []
+    os.makedirs(os.path.join(root, 'src'))
+    for i in range(SOURCES):
+        source = os.path.join(root, 'src', 'file%s.c' % i)
+        with open(source, 'w') as f:
+            for module in rand.sample(range(MODULES), 3):
+                f.write('#include <%s>\n' % header(module, rand.randrange(HEADERS_PER_MODULE)))
+            f.write('#include <stdio.h>\n')
+        sources.append(source)
+    return sources, include_directories
+
+def timed(function):
+    start = time.perf_counter()
+    res = function()
+    return time.perf_counter() - start, res
+
+def main():
+    jobs = len(sys.argv) > 1 and int(sys.argv[1]) or max(2, os.cpu_count())
+    with tempfile.TemporaryDirectory() as root:
+        sources, include_directories = make_tree(root)
+        spec = {'targets': [
+            {'target': s + '.o', 'sources': [s], 'include_directories': include_directories}
+            for s in sources
+        ]}
+        print("%s sources, %s headers, %s include directories, %s CPUs" % (
+            SOURCES, MODULES * HEADERS_PER_MODULE, DIRECTORIES, os.cpu_count()
+        ))
+
+        def per_source():
+            return [IncludeSolver(s, include_directories).result for s in sources]
+        def per_source_indexed():
+            return [
+                IncludeSolver(s, include_directories, index = IncludeIndex()).result
+                for s in sources
+            ]
+        def batch(jobs, cache = None):
+            return [headers for target, headers in scan_batch(spec, cache = cache, jobs = jobs)]
+        def cached():
+            with HeaderCache(os.path.join(root, CACHE_FILENAME), preload = True) as cache:
+                return batch(1, cache)
+
+        duration, expected = timed(per_source)
+        print("%-40s %8.3f s" % ("IncludeSolver per source", duration))
+        duration, res = timed(per_source_indexed)
+        assert res == expected
+        print("%-40s %8.3f s" % ("IncludeSolver per source, include index", duration))
+        duration, res = timed(lambda: batch(1))
+        assert res == expected
+        print("%-40s %8.3f s" % ("Batch (shared memo)", duration))
+        duration, res = timed(lambda: batch(jobs))
+        assert res == expected
+        print("%-40s %8.3f s" % ("Batch, %s processes" % jobs, duration))
+        cached()
+        duration, res = timed(cached)
+        assert res == expected
+        print("%-40s %8.3f s" % ("Batch, warm header cache", duration))
+
+if __name__ == '__main__':
+    main()
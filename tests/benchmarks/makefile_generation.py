@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+"""Benchmark the Makefile generation.
+
+    PYTHONPATH=src python tests/benchmarks/makefile_generation.py
+
+Generates the Makefile of builds copying files in a few directories, plus a
+target depending on all copies (a rule growing with the build). The time per
+command should stay constant as the build grows. Rules are streamed to disk:
+the peak memory of the generation mostly comes from the command manifest.
+"""
+
+import time
+import tracemalloc
+
+from configure import tools
+from configure.build import Build
+from configure.project import TemporaryProject
+from configure.source import Source
+from configure.target import Target
+
+DIRECTORIES = 16
+
+def make_build(build, count):
+    copies = []
+    for i in range(count):
+        copies.append(
+            build.fs.copy(
+                Source(build, 'src/file%s.txt' % i),
+                dest_dir = 'dir%s' % (i % DIRECTORIES)
+            )
+        )
+    build.fs.copy(Source(build, 'src/all.txt'), dest_dir = 'all')
+    Target(build, 'all/everything', dependencies = copies)
+
+def bench(count):
+    with TemporaryProject(build_dirs = ['build']) as project:
+        build = Build(
+            project,
+            project.directory + '/build',
+            'Makefile',
+            save_generator = False
+        )
+        make_build(build, count)
+        start = time.perf_counter()
+        build.generate()
+        duration = time.perf_counter() - start
+        # Again with the memory tracked (no file is written)
+        build = Build(
+            project,
+            project.directory + '/build',
+            'Makefile',
+            save_generator = False
+        )
+        make_build(build, count)
+        tracemalloc.start()
+        build.generate()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return duration, peak
+
+def main():
+    tools.VERBOSE = False
+    print("%8s %10s %12s %12s" % ('commands', 'time (s)', 'us/command', 'peak (KB)'))
+    for count in (100, 1000, 10000, 50000):
+        duration, peak = bench(count)
+        print("%8d %10.4f %12.2f %12d" % (
+            count, duration, duration * 1e6 / count, peak / 1024
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+"""Benchmark relative path computations.
+
+    PYTHONPATH=src python tests/benchmarks/paths.py
+
+Generators compute the path of every node relative to a few directories
+(the build directory, the target directories) several times. This compares,
+for the same workload:
+
+    relpath    os.path.relpath() and path.clean(), as before memoization
+    relative   path.relative(), memoized
+    relatives  path.relatives(), one call per start directory
+
+The memoized relative() degrades when the working set exceeds its bounds
+(see path.RELATIVE_CACHE_SIZE), relatives() does not.
+"""
+
+import os
+import time
+
+from configure import path
+
+DIRECTORIES = 64
+PASSES = 3
+
+def workload(count):
+    root = '/home/user/project'
+    build = root + '/build'
+    paths = [
+        '%s/src/dir%s/file%s.c' % (root, i % DIRECTORIES, i) for i in range(count)
+    ] + [
+        '%s/dir%s/file%s.o' % (build, i % DIRECTORIES, i) for i in range(count)
+    ]
+    starts = [build] + ['%s/dir%s' % (build, i) for i in range(4)]
+    return paths, starts
+
+def relpath(paths, starts):
+    for start in starts:
+        for p in paths:
+            path._clean(os.path.relpath(p, start = start))
+
+def relative(paths, starts):
+    for start in starts:
+        for p in paths:
+            path.relative(p, start = start)
+
+def relatives(paths, starts):
+    for start in starts:
+        path.relatives(paths, start)
+
+def bench(function, paths, starts):
+    path.clear_cache()
+    start = time.perf_counter()
+    for i in range(PASSES):
+        function(paths, starts)
+    return time.perf_counter() - start
+
+def main():
+    print("%8s %12s %12s %12s %10s" % (
+        'paths', 'relpath (s)', 'relative (s)', 'relatives (s)', 'us/path'
+    ))
+    for count in (1000, 10000, 50000):
+        paths, starts = workload(count)
+        times = [bench(f, paths, starts) for f in (relpath, relative)]
+        info = path.cache_info()['relative']
+        times.append(bench(relatives, paths, starts))
+        calls = len(paths) * len(starts) * PASSES
+        print("%8d %12.4f %12.4f %12.4f %10s   (%s hits, %s misses)" % (
+            len(paths), times[0], times[1], times[2],
+            '/'.join('%.2f' % (t * 1e6 / calls) for t in times),
+            info.hits, info.misses,
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+"""Benchmark the transitive reduction of build graphs.
+
+    PYTHONPATH=src python tests/benchmarks/transitive_reduction.py
+
+Builds graphs of libraries of 100 objects each, every object depending on
+its source and on shared include directories, every library on its objects
+and the previous library, and executables on all the libraries, objects and
+include directories (the redundant prerequisites REDUCE_DEPENDENCIES drops).
+Measures `Graph.transitive_reduction()` time and peak memory: both should
+grow linearly with the number of objects.
+"""
+
+import time
+import tracemalloc
+
+from configure.graph import Graph
+
+OBJECTS_PER_LIBRARY = 100
+INCLUDE_DIRECTORIES = 20
+EXECUTABLES = 4
+
+def make_graph(objects):
+    g = Graph()
+    include_directories = [
+        g.add_node('/include%s' % i, 'Directory') for i in range(INCLUDE_DIRECTORIES)
+    ]
+    edges = []
+    all_objects = []
+    libraries = []
+    for l in range(objects // OBJECTS_PER_LIBRARY):
+        library_objects = []
+        for i in range(OBJECTS_PER_LIBRARY):
+            source = g.add_node('/src/lib%s/f%s.c' % (l, i), 'Source')
+            object = g.add_node('/build/lib%s/f%s.o' % (l, i), 'Target')
+            edges.append((object, source))
+            edges.extend((object, d) for d in include_directories)
+            library_objects.append(object)
+        library = g.add_node('/build/lib%s.so' % l, 'Target')
+        edges.extend((library, o) for o in library_objects)
+        if libraries:
+            edges.append((library, libraries[-1]))
+        libraries.append(library)
+        all_objects.extend(library_objects)
+    for e in range(EXECUTABLES):
+        exe = g.add_node('/build/bin/exe%s' % e, 'Target')
+        edges.extend((exe, d) for d in libraries + all_objects + include_directories)
+    for node, dep in edges:
+        g.add_edge(node, dep)
+    return g.freeze(), len(edges)
+
+def main():
+    print("%8s %10s %10s %12s %10s" % (
+        'objects', 'edges', 'kept', 'time (s)', 'peak (MB)'
+    ))
+    for objects in (5000, 20000, 50000):
+        graph, edges = make_graph(objects)
+        start = time.perf_counter()
+        reduced = graph.transitive_reduction()
+        duration = time.perf_counter() - start
+        kept = sum(len(reduced.dependencies(id)) for id in range(len(reduced)))
+        del reduced
+        tracemalloc.start()
+        graph.transitive_reduction()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("%8d %10d %10d %12.3f %10.1f" % (
+            objects, edges, kept, duration, peak / (1024 * 1024)
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+"""Benchmark the build graph traversal.
+
+    PYTHONPATH=src python tests/benchmarks/traversal.py
+
+Builds layered graphs where every target depends on all targets of the
+previous layer (a chain of diamonds), and measures `Build.visit()` and
+`Build.nodes()`. The time per node and edge should stay constant as the
+graph grows.
+"""
+
+import time
+
+from configure.build import Build
+from configure.project import TemporaryProject
+from configure.source import Source
+from configure.target import Target
+
+WIDTH = 8
+
+def make_graph(build, layers, width = WIDTH):
+    previous = [Source(build, 'src%s.c' % i) for i in range(width)]
+    edges = 0
+    for layer in range(layers):
+        current = []
+        for i in range(width):
+            current.append(Target(build, 'l%s/t%s' % (layer, i), dependencies = list(previous)))
+            edges += len(previous)
+        previous = current
+    return (layers + 1) * width, edges
+
+def bench(layers):
+    with TemporaryProject() as project:
+        build = Build(project, project.directory + '/build', 'Makefile', save_generator = False)
+        nodes, edges = make_graph(build, layers)
+        count = []
+        start = time.perf_counter()
+        build.visit(count.append)
+        visit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        ordered = sum(1 for _ in build.nodes())
+        walk_time = time.perf_counter() - start
+        assert len(count) == nodes, (len(count), nodes)
+        assert ordered == nodes
+        return nodes, edges, visit_time, walk_time
+
+def main():
+    print("%8s %8s %10s %12s %10s %12s" % (
+        'nodes', 'edges', 'visit (s)', 'us/elem', 'walk (s)', 'us/elem'
+    ))
+    for layers in (10, 100, 1000, 5000):
+        nodes, edges, visit_time, walk_time = bench(layers)
+        elements = nodes + edges
+        print("%8d %8d %10.4f %12.3f %10.4f %12.3f" % (
+            nodes, edges,
+            visit_time, visit_time * 1e6 / elements,
+            walk_time, walk_time * 1e6 / elements,
+        ))
+
+if __name__ == '__main__':
+    main()
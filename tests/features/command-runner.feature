@@ -0,0 +1,50 @@
+@c
+Feature: Build commands are run through the command server
+
+	Scenario: Build with the command server
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build -G Makefile
+		And I build everything
+		Then I can launch test.exe
+
+	Scenario: Build without the command server
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build COMMAND_RUNNER=false -G Makefile
+		And I build everything
+		Then I can launch test.exe
+
+	Scenario: Failing commands fail the build
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return undefined_variable; }
+		"""
+		When I configure with build -G Makefile
+		And I build everything
+		Then the build failed
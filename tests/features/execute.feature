@@ -0,0 +1,42 @@
+@c
+Feature: Builds can be executed by configure.py
+
+	Scenario: Configure and execute a build
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build --execute -j 2
+		Then I can launch test.exe
+
+	Scenario: Header changes are honored by the executor
+		Given a source file test.c
+		"""
+		#include "test.h"
+		int main()
+		{ return (ANSWER == 42 ? 0 : 1); }
+		"""
+		And a source file test.h
+		"""
+		#define ANSWER 32
+		"""
+		And a project configuration
+		"""
+		def main(build):
+			from configure.lang.c import find_compiler
+			find_compiler(build).link_executable('test.exe', ['test.c'])
+		"""
+		When I configure with build --execute
+		And a source file test.h
+		"""
+		#define ANSWER 42
+		"""
+		And I configure with build --execute
+		Then I can launch test.exe
@@ -0,0 +1,36 @@
+@c
+Feature: Commands can be written directly in build rules
+
+	Scenario: Build with native commands
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build --native-commands -G Makefile
+		And I build everything
+		Then I can launch test.exe
+
+	Scenario: Changed native commands are run again
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'], defines = [build.env.ANSWER])
+		"""
+		And a source file test.c
+		"""
+		int main() { return (ANSWER == 42 ? 0 : 1); }
+		"""
+		When I configure with build ANSWER=ANSWER=32 --native-commands -G Makefile
+		And I build everything
+		And I configure with build ANSWER=ANSWER=42
+		And I build everything
+		Then I can launch test.exe
@@ -0,0 +1,82 @@
+@c
+Feature: Ninja generator
+
+	Scenario: Build an executable with ninja
+		Given a system executable ninja
+		And a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build -G Ninja
+		And I build everything
+		Then I can launch test.exe
+
+	Scenario: Header dependencies with ninja
+		Given a system executable ninja
+		And a source file test.c
+		"""
+		#include "test.h"
+		int main()
+		{ return (ANSWER == 42 ? 0 : 1); }
+		"""
+		And a source file test.h
+		"""
+		#define ANSWER 32
+		"""
+		And a project configuration
+		"""
+		def main(build):
+			from configure.lang.c import find_compiler
+			find_compiler(build).link_executable('test.exe', ['test.c'])
+		"""
+		When I configure with build -G Ninja
+		And I build everything
+		And a source file test.h
+		"""
+		#define ANSWER 42
+		"""
+		And I build everything
+		Then I can launch test.exe
+
+	Scenario: Changed commands are run again with ninja
+		Given a system executable ninja
+		And a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'], defines = [build.env.ANSWER])
+		"""
+		And a source file test.c
+		"""
+		int main() { return (ANSWER == 42 ? 0 : 1); }
+		"""
+		When I configure with build ANSWER=ANSWER=32 -G Ninja
+		And I build everything
+		And I configure with build ANSWER=ANSWER=42
+		And I build everything
+		Then I can launch test.exe
+
+	Scenario: Native commands with ninja
+		Given a system executable ninja
+		And a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build --native-commands -G Ninja
+		And I build everything
+		Then I can launch test.exe
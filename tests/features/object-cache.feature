@@ -0,0 +1,23 @@
+@c
+Feature: Objects can be cached
+
+	Scenario: Objects are reused from the cache
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'], defines = [build.env.ANSWER])
+		"""
+		And a source file test.c
+		"""
+		int main() { return (ANSWER == 42 ? 0 : 1); }
+		"""
+		When I configure with build ANSWER=ANSWER=42 OBJECT_CACHE=true
+		And I build everything
+		And I configure with build ANSWER=ANSWER=32
+		And I build everything
+		And I configure with build ANSWER=ANSWER=42
+		And I build everything
+		Then I can launch test.exe
+		And the object cache has 2 hits and 4 misses
@@ -0,0 +1,18 @@
+@c
+Feature: Configure phases can be profiled
+
+	Scenario: Profile a configure run
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build --profile-dump configure.prof
+		Then the build is configured
+		And configure.prof is a profile dump
@@ -0,0 +1,52 @@
+@c
+Feature: The build graph can be queried
+
+	Scenario: Query dependencies and dependents
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure the build
+		Then the build is configured
+		When I query rdeps test.c build
+		Then the query lists Target build/test.c.o, ExecutableTarget build/test.exe
+		When I query deps build/test.exe build
+		Then the query lists Target build/test.c.o, CSource test.c
+		When I query path test.c build/test.exe build
+		Then the query lists ExecutableTarget build/test.exe, Target build/test.c.o, CSource test.c
+
+	Scenario Outline: Query the dependents of a header (<mode>)
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file common.h
+		"""
+		#define ANSWER 42
+		"""
+		And a source file test.c
+		"""
+		#include "common.h"
+		int main() { return ANSWER - 42; }
+		"""
+		When I configure with build HEADER_DEPENDENCIES=<mode> -G Makefile
+		And I build everything
+		And I query rdeps common.h build
+		Then the query lists Target build/test.c.o, ExecutableTarget build/test.exe
+		When I query path build/test.exe common.h build
+		Then the query lists ExecutableTarget build/test.exe, Target build/test.c.o, Header common.h
+
+		Examples:
+			| mode    |
+			| depfile |
+			| scan    |
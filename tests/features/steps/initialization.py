@@ -79,6 +79,11 @@ def step_impl(context):
     assert context.configured
     context.built = context.cmd('make', '-C', 'build') == 0
 
+@then('the build failed')
+def step_impl(context):
+    assert context.configured
+    assert not context.built
+
 @then('I can launch {exe}')
 def step_impl(context, exe):
     assert context.built
@@ -98,4 +103,6 @@ def impl(context, args):
     context.configured = context.cmd('configure', *tuple(shlex.split(args))) == 0
     if '--init' in args:
         context.initialized = context.configured
+    if '--execute' in args:
+        context.built = context.configured
 
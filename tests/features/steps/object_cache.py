@@ -0,0 +1,11 @@
+import os
+
+from configure.lang.c import object_cache
+
+@then('the object cache has {hits} hits and {misses} misses')
+def step_impl(context, hits, misses):
+    stats = object_cache.read_stats(
+        os.path.join(context.directory, '.config', 'object-cache')
+    )
+    assert stats['hits'] == int(hits), stats
+    assert stats['misses'] == int(misses), stats
@@ -0,0 +1,6 @@
+import pstats
+
+@then('{filename} is a profile dump')
+def step_impl(context, filename):
+    stats = pstats.Stats(filename)
+    assert stats.total_calls > 0
@@ -0,0 +1,16 @@
+import shlex
+import subprocess
+
+@when('I query {args}')
+def step_impl(context, args):
+    process = subprocess.run(
+        ('configure', 'query') + tuple(shlex.split(args)),
+        stdout = subprocess.PIPE,
+    )
+    assert process.returncode == 0
+    context.query_output = process.stdout.decode('utf8').splitlines()
+
+@then('the query lists {lines}')
+def step_impl(context, lines):
+    expected = [l.strip() for l in lines.split(',')]
+    assert context.query_output == expected, context.query_output
@@ -0,0 +1,23 @@
+import json
+import shlex
+import subprocess
+
+@then('{filename} is a trace of {count} commands')
+def step_impl(context, filename, count):
+    with open(filename) as f:
+        trace = json.load(f)
+    events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    assert len(events) == int(count), events
+
+@when('I export a trace with {args}')
+def step_impl(context, args):
+    process = subprocess.run(
+        ('configure',) + tuple(shlex.split(args)),
+        stderr = subprocess.PIPE,
+    )
+    assert process.returncode == 0
+    context.trace_output = process.stderr.decode('utf8')
+
+@then('the trace warns that native commands are not traced')
+def step_impl(context):
+    assert 'are not traced' in context.trace_output, context.trace_output
@@ -0,0 +1,68 @@
+@c
+Feature: Build timelines can be exported
+
+	Scenario: Trace of an executed build
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build --execute --trace trace.json
+		Then trace.json is a trace of 2 commands
+
+	Scenario: Trace of a generated build
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build TRACE=1 -G Makefile
+		And I build everything
+		And I configure with build --trace trace.json
+		Then trace.json is a trace of 2 commands
+
+	Scenario: Native commands are not traced
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build -G Makefile --native-commands
+		And I build everything
+		And I export a trace with build --trace trace.json
+		Then the trace warns that native commands are not traced
+		And trace.json is a trace of 0 commands
+
+	Scenario: Commands are not logged unless tracing is enabled
+		Given a project configuration
+		"""
+		import configure.lang.c
+		def main(build):
+			cc = configure.lang.c.find_compiler(build)
+			cc.link_executable('test.exe', ['test.c'])
+		"""
+		And a source file test.c
+		"""
+		int main() { return 0; }
+		"""
+		When I configure with build -G Makefile
+		And I build everything
+		Then build/.build-commands.trace does not exist